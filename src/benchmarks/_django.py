@@ -0,0 +1,18 @@
+import os
+
+import django
+
+
+def setup(database=':memory:'):
+    """
+    Configures Django with a throwaway SQLite database and migrates it.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'when.settings')
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
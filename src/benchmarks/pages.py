@@ -0,0 +1,108 @@
+"""
+Measures the latency of the log and feed pages with growing tables: for
+every size, the log table holds that many rows, for a tenth as many events.
+
+Run from the src directory: python -m benchmarks.pages 10000 100000
+"""
+import datetime as dt
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks._django import setup
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+CHUNK_SIZE = 10000
+REPEAT = 20
+
+
+def populate(events, logs):
+    """Adds events and log rows until there are as many as given."""
+    from django.db import connection
+    from django.utils.timezone import now
+    from when.events.models import Event, Log
+
+    start = now() - dt.timedelta(days=365)
+    existing = Event.objects.count()
+    for offset in range(existing, events, CHUNK_SIZE):
+        Event.objects.bulk_create([
+            Event(
+                data_url='http://{}.example/event.json'.format(number), state='ok',
+                name='Event {}'.format(number), short_name='event-{}'.format(number),
+                start_date=(start + dt.timedelta(hours=number)).date(),
+                last_changed=start + dt.timedelta(minutes=number),
+                tags=',python,open,', languages=',en,',
+            )
+            for number in range(offset, min(offset + CHUNK_SIZE, events))
+        ])
+    event_ids = list(Event.objects.order_by('pk').values_list('pk', flat=True))
+    existing = Log.objects.count()
+    for offset in range(existing, logs, CHUNK_SIZE):
+        Log.objects.bulk_create([
+            Log(
+                event_id=event_ids[number % len(event_ids)], state='ok',
+                content={'action': 'update', 'fields': ['name'] if number % 3 else []},
+            )
+            for number in range(offset, min(offset + CHUNK_SIZE, logs))
+        ])
+    # Spread the timestamps, which are all set to now() by auto_now_add.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE events_log SET timestamp = strftime('%Y-%m-%d %H:%M:%f', 'now', "
+            "'-' || ((SELECT MAX(id) FROM events_log) - id) || ' seconds')"
+        )
+
+
+def measure(client, url, repeat=REPEAT, clear_cache=False):
+    from django.core.cache import cache
+
+    timings = []
+    for _ in range(repeat):
+        if clear_cache:
+            cache.clear()
+        start = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+    return statistics.median(timings) * 1000
+
+
+def main(sizes=DEFAULT_SIZES):
+    setup()
+    from django.test import Client, override_settings
+    from when.events.models import Event, Log
+    from when.events.views import encode_cursor
+
+    Event.objects.all().delete()
+    client = Client()
+    results = {}
+    with override_settings(
+        ALLOWED_HOSTS=['testserver'],
+        STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False, COMPRESS_ROOT=tempfile.mkdtemp(),
+    ):
+        for size in sizes:
+            start = time.perf_counter()
+            populate(max(size // 10, 1), size)
+            print('{:>8} rows: populated in {:.1f}s'.format(size, time.perf_counter() - start))
+            middle = Log.objects.order_by('pk')[size // 2]
+            pages = {
+                'log_first_page': ('/log', False),
+                'log_middle_page': ('/log?before=' + encode_cursor(middle), False),
+                'updates_feed_page': ('/feed/updates?since={}'.format(middle.pk), False),
+                'json_feed_cached': ('/feed/new', False),
+                'json_feed_uncached': ('/feed/new', True),
+            }
+            results[size] = {}
+            for name, (url, clear_cache) in pages.items():
+                repeat = 3 if clear_cache else REPEAT
+                results[size][name] = measure(client, url, repeat=repeat, clear_cache=clear_cache)
+                print('{:>8} rows: {:>20}: {:>10.2f} ms'.format(size, name, results[size][name]))
+    return {'{}_rows'.format(size): values for size, values in results.items()}
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
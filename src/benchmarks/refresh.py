@@ -0,0 +1,45 @@
+"""
+Measures the end-to-end throughput of refreshing events against the local
+stub server: a first pass importing all documents, and a second pass in
+which every valid document is answered with a 304.
+
+Run from the src directory: python -m benchmarks.refresh
+"""
+import time
+from collections import Counter
+
+from benchmarks._django import setup
+from benchmarks.stub_server import StubServer
+
+
+def main(count=2000, workers=16, batch_size=100):
+    setup()
+    from django.test import override_settings
+    from when.events import hosts
+    from when.events.models import Event
+    from when.events.refresh import refresh_events
+
+    Event.objects.all().delete()
+    results = {}
+    # All documents are served by one local host, which must not be
+    # rate-limited like a remote one.
+    hosts.reset()
+    with StubServer() as server, override_settings(WHEN_FETCH_HOST_RATE=10 ** 6, WHEN_FETCH_HOST_BURST=10 ** 6):
+        Event.objects.bulk_create([Event(data_url=server.url(number), state='new') for number in range(count)])
+        for name in ('import', 'unchanged'):
+            start = time.perf_counter()
+            states = Counter(
+                log.state for event, log in refresh_events(
+                    Event.objects.all(), workers=workers, per_host=workers, batch_size=batch_size,
+                )
+            )
+            seconds = time.perf_counter() - start
+            results[name] = {'events_per_second': count / seconds, 'states': dict(states)}
+            print('{:>10}: {:>10.0f} events/s ({})'.format(
+                name, count / seconds, ', '.join('{} {}'.format(n, state) for state, n in sorted(states.items()))
+            ))
+    return results
+
+
+if __name__ == '__main__':
+    main()
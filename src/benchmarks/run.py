@@ -0,0 +1,55 @@
+"""
+Runs all benchmarks and writes their results as JSON, together with the
+commit and Python version, so that results can be compared between commits.
+
+Run from the src directory:
+python -m benchmarks.run --output results.json [--sizes 10000 100000 1000000]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+from benchmarks import pages, refresh, schema_validation, update
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs all benchmarks.')
+    parser.add_argument('--output', help='File to write the results to. Defaults to stdout.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=pages.DEFAULT_SIZES, help='Log table sizes for the page benchmarks.')
+    parser.add_argument('--events', type=int, default=2000, help='Number of events to refresh from the stub server.')
+    args = parser.parse_args(argv)
+
+    results = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'started': datetime.now(timezone.utc).isoformat(),
+        'benchmarks': {},
+    }
+    # Progress goes to stderr, so that stdout can be used for the results.
+    with redirect_stdout(sys.stderr):
+        results['benchmarks']['schema_validation'] = schema_validation.main()
+        results['benchmarks']['update'] = update.main()
+        results['benchmarks']['refresh'] = refresh.main(count=args.events)
+        results['benchmarks']['pages'] = pages.main(args.sizes)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Compares validation throughput of the cached schema validators with the
+previous approach of loading the schema and building a validator per call.
+
+Run from the src directory: python -m benchmarks.schema_validation
+"""
+import json
+import os
+import timeit
+
+import jsonschema
+
+from when import schema
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'example_event.json')
+
+
+def uncached(instance):
+    with open(os.path.join(schema.SCHEMA_DIR, 'schema-0.1.0.json')) as f:
+        used_schema = json.load(f)
+    jsonschema.validate(instance, used_schema, format_checker=jsonschema.draft7_format_checker)
+
+
+def cached(instance):
+    schema.validate(instance, '0.1.0')
+
+
+def main(number=2000):
+    with open(EXAMPLE) as f:
+        instance = json.load(f)
+    results = {}
+    for name, func in (('uncached', uncached), ('cached', cached)):
+        func(instance)
+        seconds = min(timeit.repeat(lambda: func(instance), number=number, repeat=3))
+        results[name] = number / seconds
+        print('{:>10}: {:>10.0f} validations/s'.format(name, results[name]))
+    print('{:>10}: {:>10.1f}x'.format('speedup', results['cached'] / results['uncached']))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+A local HTTP server serving generated event documents, for benchmarks.
+
+The documents are derived from example_event.json and are reproducible:
+what a document looks like only depends on its number.
+
+- sizes vary from a few hundred bytes to about 64 KiB of description
+- every ``SLOW_EVERY``th document is delayed by ``slow_delay`` seconds
+- every ``INVALID_EVERY``th document is invalid: every other one of them
+  violates the schema, the others are not even JSON
+- all documents have an ETag, and matching conditional requests get a 304
+
+Run from the src directory to serve documents until interrupted:
+python -m benchmarks.stub_server
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'example_event.json')
+SLOW_EVERY = 10
+INVALID_EVERY = 25
+DESCRIPTION_SIZES = (200, 2000, 16000, 64000)
+WORDS = ('call', 'papers', 'talk', 'workshop', 'python', 'open', 'source', 'community', 'keynote', 'venue')
+
+with open(EXAMPLE) as f:
+    EXAMPLE_CONTENT = json.load(f)
+
+
+@lru_cache(maxsize=4096)
+def get_document(number):
+    """Returns the body of the given document as bytes."""
+    rng = random.Random(number)
+    if number % INVALID_EVERY == 0 and number % (2 * INVALID_EVERY) == 0:
+        return b'{"version": "0.1.0", "name": '
+    document = dict(EXAMPLE_CONTENT)
+    document['name'] = 'Event {}'.format(number)
+    document['shortName'] = 'event-{}'.format(number)
+    size = rng.choice(DESCRIPTION_SIZES)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    document['description'] = ' '.join(words)
+    document['tags'] = rng.sample(WORDS, 3)
+    if number % INVALID_EVERY == 0:
+        del document['name']
+    return json.dumps(document).encode()
+
+
+def get_etag(body):
+    return '"{}"'.format(hashlib.sha1(body).hexdigest())
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        try:
+            number = int(self.path.rsplit('/', 1)[-1].split('.', 1)[0])
+        except ValueError:
+            self.send_error(404)
+            return
+        if number % SLOW_EVERY == 0:
+            time.sleep(self.server.slow_delay)
+        body = get_document(number)
+        etag = get_etag(body)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """
+    Serves documents on a free local port while used as a context manager.
+    """
+
+    def __init__(self, slow_delay=0.05, port=0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.server.slow_delay = slow_delay
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, number):
+        return 'http://127.0.0.1:{}/events/{}.json'.format(self.server.server_address[1], number)
+
+
+if __name__ == '__main__':
+    with StubServer(port=8001) as server:
+        print('Serving documents like {}'.format(server.url(1)))
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
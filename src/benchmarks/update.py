@@ -0,0 +1,56 @@
+"""
+Measures the throughput of Event._update on the example event, and compares
+the key mapping step with the previous per-key decamel/hasattr approach.
+
+Run from the src directory: python -m benchmarks.update
+"""
+import json
+import os
+import timeit
+
+from benchmarks._django import setup
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'example_event.json')
+
+
+def main(number=2000):
+    setup()
+    from when.events.mapping import decamel, get_plan
+    from when.events.models import Event
+
+    with open(EXAMPLE) as f:
+        data = json.load(f)
+    event = Event.objects.create(data_url='http://localhost', state='new')
+    event._update(data)
+
+    def legacy_mapping():
+        for field, value in data.items():
+            if field == 'version':
+                continue
+            local_name = decamel(field)
+            if hasattr(event, local_name[:-1] + '_list'):
+                local_name = local_name[:-1] + '_list'
+            getattr(event, local_name) == value
+
+    def planned_mapping():
+        plan = get_plan(data['version'], Event)
+        for field, value in data.items():
+            mapping = plan.get(field)
+            if mapping is None:
+                continue
+            getattr(event, mapping.attribute) == mapping.coerce(value)
+
+    results = {}
+    for name, func in (
+        ('legacy mapping', legacy_mapping),
+        ('planned mapping', planned_mapping),
+        ('_update (unchanged)', lambda: event._update(data)),
+    ):
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        results[name] = number / seconds
+        print('{:>20}: {:>10.0f} documents/s'.format(name, results[name]))
+    return results
+
+
+if __name__ == '__main__':
+    main()
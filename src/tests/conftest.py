@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from when.events import client as http_client
+
+
+class MockResponse:
+    def __init__(self, json_content, status_code=200, url=None, headers=None):
+        self.status_code = status_code
+        self.url = url
+        self.headers = headers or {}
+        self._content = json_content
+
+    def json(self):
+        return self._content
+
+    @property
+    def content(self):
+        return json.dumps(self._content).encode()
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise Exception
+
+
+@pytest.fixture(autouse=True)
+def plain_static_files(settings, tmp_path):
+    settings.STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    settings.COMPRESS_ENABLED = settings.COMPRESS_OFFLINE = False
+    settings.COMPRESS_ROOT = str(tmp_path)
+
+
+@pytest.fixture
+def example_content():
+    """A fresh copy of the example event document."""
+    with open("example_event.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def mock_response():
+    """The class of fake responses to return from ``mock_get``."""
+    return MockResponse
+
+
+@pytest.fixture
+def mock_get(monkeypatch):
+    """
+    Replaces the HTTP client: call it with a function that takes the URL and
+    keyword arguments and returns a response.
+    """
+    def install(get):
+        monkeypatch.setattr(http_client, "get", get)
+    return install
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+from django.core.cache import cache
+
+from when import schema
+from when.events import api
+from when.events.models import Event
+
+
+@pytest.fixture
+def event(example_content):
+    cache.clear()
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(example_content)
+    return event
+
+
+def content(response):
+    return json.loads(b''.join(response.streaming_content if response.streaming else [response.content]).decode())
+
+
+@pytest.mark.django_db
+def test_serialized_event_matches_the_schema(event, example_content):
+    data = api.serialize(Event.objects.get(pk=event.pk))
+    schema.validate(data, data['version'])
+    assert data['name'] == example_content['name']
+    assert data['startDate'] == example_content['startDate']
+    assert data['tags'] == example_content['tags']
+
+
+@pytest.mark.django_db
+def test_event_list(client, event):
+    Event.objects.create(data_url="http://localhost/new", state='new')
+    response = client.get('/api/events')
+    assert response.streaming
+    data = content(response)
+    assert len(data['events']) == 1
+    assert data['events'][0] == api.serialize(event)
+    assert client.get('/api/events', HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+
+@pytest.mark.django_db
+def test_event_list_fields(client, event):
+    data = content(client.get('/api/events?fields=name,startDate,cfpDeadline'))
+    assert list(data['events'][0]) == ['name', 'startDate', 'cfpDeadline']
+    assert client.get('/api/events?fields=name,data_url').status_code == 400
+
+
+@pytest.mark.django_db
+def test_event_detail(client, event, example_content):
+    response = client.get('/api/events/by-name/{}?fields=shortName,name'.format(event.short_name))
+    assert content(response) == {'shortName': event.short_name, 'name': event.name}
+    assert client.get('/api/events/by-name/unknown').status_code == 404
+
+    # Short names may be the same as other routes.
+    event._update(dict(example_content, shortName='search'))
+    response = client.get('/api/events/by-name/search?fields=shortName')
+    assert content(response) == {'shortName': 'search'}
+    assert client.get('/api/events/search').status_code == 400
+
+
+@pytest.mark.django_db
+def test_cache_is_invalidated_by_changes_only(client, event, example_content, django_assert_num_queries):
+    with django_assert_num_queries(3):
+        # version, ids, and the uncached event
+        client.get('/api/events').getvalue()
+    with django_assert_num_queries(2):
+        assert content(client.get('/api/events'))['events'][0]['name'] == example_content['name']
+
+    # An unchanged poll keeps the cached representation.
+    Event.objects.get(pk=event.pk)._update(example_content)
+    with django_assert_num_queries(2):
+        client.get('/api/events').getvalue()
+
+    Event.objects.get(pk=event.pk)._update(dict(example_content, name='Changed Conference'))
+    with django_assert_num_queries(3):
+        assert content(client.get('/api/events'))['events'][0]['name'] == 'Changed Conference'
@@ -0,0 +1,102 @@
+import datetime as dt
+
+import pytest
+import pytz
+from django.core.cache import cache
+
+from when.events import calendar
+from when.events.models import Event, EventMonth, sync_derived
+
+
+def make_event(name, start_date, end_date=None, cfp_deadline=None):
+    event = Event.objects.create(
+        data_url='http://{}.example'.format(name), state='ok', name=name, short_name=name,
+        start_date=start_date, end_date=end_date, cfp_deadline=cfp_deadline,
+    )
+    sync_derived([(event, None)])
+    return event
+
+
+@pytest.fixture
+def events():
+    cache.clear()
+    return {
+        'april': make_event('april', dt.date(2019, 4, 10), dt.date(2019, 4, 12)),
+        'overlap': make_event('overlap', dt.date(2019, 4, 29), dt.date(2019, 5, 2)),
+        'may': make_event(
+            'may', dt.date(2019, 5, 20), dt.date(2019, 5, 24),
+            cfp_deadline=dt.datetime(2019, 4, 30, 23, 30, tzinfo=pytz.utc),
+        ),
+        'long': make_event('long', dt.date(2019, 3, 1), dt.date(2019, 6, 30)),
+    }
+
+
+def test_get_months():
+    assert EventMonth.get_months(dt.date(2019, 11, 20), dt.date(2020, 2, 1)) == [
+        dt.date(2019, 11, 1), dt.date(2019, 12, 1), dt.date(2020, 1, 1), dt.date(2020, 2, 1),
+    ]
+    assert EventMonth.get_months(dt.date(2019, 11, 20)) == [dt.date(2019, 11, 1)]
+    assert len(EventMonth.get_months(dt.date(2000, 1, 1), dt.date(2100, 1, 1))) == EventMonth.MAX_MONTHS
+    assert calendar.add_months(dt.date(2019, 11, 20), 3) == dt.date(2020, 2, 1)
+    assert calendar.add_months(dt.date(2019, 1, 20), -1) == dt.date(2018, 12, 1)
+    assert calendar.add_months(dt.date(9999, 6, 1), 12) == dt.date(9999, 12, 1)
+    assert calendar.add_months(dt.date(1, 6, 1), -12) == dt.date(1, 1, 1)
+
+
+@pytest.mark.django_db
+def test_get_events(events):
+    assert list(calendar.get_events(dt.date(2019, 5, 1), dt.date(2019, 5, 31))) == [
+        events['long'], events['overlap'], events['may'],
+    ]
+    assert list(calendar.get_events(dt.date(2019, 4, 13), dt.date(2019, 4, 28))) == [events['long']]
+
+
+@pytest.mark.django_db
+def test_months_follow_date_changes(events):
+    event = events['may']
+    event.start_date, event.end_date = dt.date(2019, 7, 1), dt.date(2019, 7, 2)
+    event.save()
+    sync_derived([(event, {'start_date', 'end_date'})])
+    assert list(event.months.values_list('month', flat=True)) == [dt.date(2019, 7, 1)]
+
+
+@pytest.mark.django_db
+def test_calendar_api(client, events, django_assert_max_num_queries):
+    data = client.get('/events/calendar', {'start': '2019-05-01', 'end': '2019-05-31', 'tz': 'Europe/Berlin'}).json()
+    assert [event['shortName'] for event in data['events']] == ['long', 'overlap', 'may']
+    # 23:30 UTC on April 30th is already May 1st in Berlin.
+    assert data['cfps'] == [{
+        'shortName': 'may', 'name': 'may', 'url': 'http://may.example', 'deadline': '2019-05-01T01:30:00+02:00',
+    }]
+    assert data['months']['2019-04'] == 3
+    assert data['months']['2019-05'] == 3
+    assert data['months']['2019-06'] == 1
+
+    data = client.get('/events/calendar', {'start': '2019-04-01', 'end': '2019-04-30'}).json()
+    assert data['cfps'][0]['deadline'] == '2019-04-30T23:30:00+00:00'
+
+    with django_assert_max_num_queries(3):
+        client.get('/events/calendar', {'start': '2019-04-01', 'end': '2019-04-30'})
+
+    assert client.get('/events/calendar', {'start': '2019-05-01', 'end': '2021-05-01'}).status_code == 400
+    assert client.get('/events/calendar', {'start': 'may'}).status_code == 400
+    assert client.get('/events/calendar', {'tz': 'Mars/Olympus'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_get_cfps_includes_imported_events_only(events):
+    start, end = dt.date(2019, 4, 1), dt.date(2019, 4, 30)
+    deadline = dt.datetime(2019, 4, 20, tzinfo=pytz.utc)
+    Event.objects.filter(pk=events['may'].pk).update(state='unreachable')
+    Event.objects.create(data_url='http://new.example', state='new', cfp_deadline=deadline)
+    assert list(calendar.get_cfps(start, end, pytz.utc)) == [events['may']]
+
+
+@pytest.mark.django_db
+def test_calendar_api_at_the_limits_of_the_calendar(client, events):
+    for start, end in (('9999-06-01', '9999-06-30'), ('0001-01-02', '0001-01-31')):
+        response = client.get('/events/calendar', {'start': start, 'end': end, 'tz': 'Pacific/Kiritimati'})
+        assert response.status_code == 200
+        assert response.json()['events'] == []
+    for params in ({'start': '0001-01-01'}, {'start': '9999-12-01', 'end': '9999-12-31'}, {'start': '9999-12-05'}):
+        assert client.get('/events/calendar', params).status_code == 400
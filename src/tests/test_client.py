@@ -0,0 +1,53 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from when.events import client
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/large':
+            body = b'x' * 4096
+        elif self.path == '/gzip':
+            body = gzip.compress(b'{"version": "0.1.0"}')
+        else:
+            body = b'{"version": "0.1.0"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if self.path == '/gzip':
+            self.send_header('Content-Encoding', 'gzip')
+        if self.path != '/large':
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_get(server):
+    response = client.get(server + '/event.json')
+    assert response.json() == {'version': '0.1.0'}
+    assert client.get(server + '/gzip').json() == {'version': '0.1.0'}
+
+
+def test_get_aborts_large_responses(server, settings):
+    settings.WHEN_FETCH_MAX_SIZE = 1024
+    with pytest.raises(client.ResponseTooLarge):
+        client.get(server + '/large')
+    with pytest.raises(requests.RequestException):
+        client.get(server + '/large')
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+from django.conf import settings
+from django.db import transaction
+from django.db.utils import ConnectionHandler
+
+from when.db.router import ReadRouter
+
+
+@pytest.fixture
+def databases(tmp_path, django_db_blocker, monkeypatch):
+    name = str(tmp_path / 'db.sqlite3')
+    handler = ConnectionHandler({
+        # A small page cache makes a large write transaction spill to the
+        # database file before it commits, which blocks readers without WAL.
+        'default': {'ENGINE': 'when.db', 'NAME': name, 'OPTIONS': dict(
+            settings.DATABASE_OPTIONS, pragmas=dict(settings.DATABASE_OPTIONS['pragmas'], cache_size=2),
+        )},
+        # Readers must not wait at all, so that any blocking fails the test.
+        'read': {'ENGINE': 'when.db', 'NAME': name, 'OPTIONS': {
+            'pragmas': dict(settings.DATABASE_OPTIONS['pragmas'], busy_timeout=0, query_only=1),
+        }},
+    })
+    # Lets transaction.atomic() use these connections.
+    monkeypatch.setattr(transaction, 'connections', handler)
+    with django_db_blocker.unblock():
+        with handler['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE event (id INTEGER PRIMARY KEY, name TEXT)')
+        yield handler
+        handler.close_all()
+
+
+def pragma(connection, name):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA {}'.format(name))
+        return cursor.fetchone()[0]
+
+
+def count(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM event')
+        return cursor.fetchone()[0]
+
+
+def test_pragmas_are_applied_to_every_connection(databases):
+    assert pragma(databases['default'], 'journal_mode') == 'wal'
+    assert pragma(databases['default'], 'busy_timeout') == 20000
+    assert pragma(databases['default'], 'synchronous') == 1
+    assert pragma(databases['default'], 'mmap_size') == 256 * 1024 * 1024
+    assert pragma(databases['read'], 'busy_timeout') == 0
+    assert pragma(databases['read'], 'query_only') == 1
+
+
+def test_readers_are_not_blocked_during_writes(databases):
+    written = threading.Event()
+    read = threading.Event()
+    errors = []
+
+    def write():
+        connection = databases['default']
+        try:
+            for batch in range(5):
+                with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                    cursor.executemany(
+                        'INSERT INTO event (name) VALUES (%s)', [('Event {}'.format(number),) for number in range(1000)]
+                    )
+                    if batch == 2:
+                        written.set()
+                        # Keep the transaction open until the reader is done.
+                        read.wait(5)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    assert written.wait(5)
+    # The reader sees the committed batches, without waiting for the
+    # transaction of the third one.
+    assert count(databases['read']) == 2000
+    read.set()
+    writer.join()
+    assert not errors
+    assert count(databases['read']) == 5000
+
+
+def test_readers_do_not_block_writers(databases):
+    reader = databases['read']
+    with transaction.atomic(using=reader.alias):
+        assert count(reader) == 0
+        finished = threading.Event()
+
+        def write():
+            connection = databases['default']
+            with connection.cursor() as cursor:
+                cursor.execute('INSERT INTO event (name) VALUES (%s)', ['Event'])
+            connection.close()
+            finished.set()
+
+        threading.Thread(target=write).start()
+        assert finished.wait(5)
+        # The open read transaction keeps its snapshot.
+        assert count(reader) == 0
+    assert count(reader) == 1
+
+
+def test_read_router(transactional_db):
+    router = ReadRouter()
+    assert router.db_for_read(None) == 'read'
+    assert router.db_for_write(None) == 'default'
+    with transaction.atomic():
+        assert router.db_for_read(None) == 'default'
+    assert router.allow_migrate('default', 'events')
+    assert not router.allow_migrate('read', 'events')
@@ -1,38 +1,17 @@
-import json
+import importlib
 
 import pytest
-import requests
+from django.apps import apps
 
 from when.events.models import Event
 
 
-class MockResponse:
-    def __init__(self, json_content, status_code=200, url=None):
-        self.status_code = status_code
-        self.url = url
-        self._content = json_content
-
-    def json(self):
-        return self._content
-
-    @property
-    def content(self):
-        return json.dumps(self._content).encode()
-
-    def raise_for_status(self):
-        if self.status_code != 200:
-            raise Exception
-
-
 @pytest.mark.django_db
-def test_base_event(monkeypatch):
-    with open("example_event.json") as f:
-        example_content = json.load(f)
-
-    def mock_get(url):
-        return MockResponse(example_content, url=url)
+def test_base_event(example_content, mock_response, mock_get):
+    def get(url, **kwargs):
+        return mock_response(example_content, url=url)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    mock_get(get)
 
     event = Event.objects.create(data_url="http://localhost")
     event.fetch()
@@ -43,17 +22,147 @@ def test_base_event(monkeypatch):
 
 
 @pytest.mark.django_db
-def test_base_event_failure(monkeypatch):
-    with open("example_event.json") as f:
-        example_content = json.load(f)
-
+def test_base_event_failure(example_content, mock_response, mock_get):
     example_content.pop("name")
 
-    def mock_get(url):
-        return MockResponse(example_content, url=url)
+    def get(url, **kwargs):
+        return mock_response(example_content, url=url)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    mock_get(get)
 
     event = Event.objects.create(data_url="http://localhost")
     event.fetch()
     assert event.state == "error"
+
+
+@pytest.mark.django_db
+def test_conditional_fetch(django_assert_num_queries, example_content, mock_response, mock_get):
+    requests_made = []
+
+    def get(url, headers=None):
+        requests_made.append(headers)
+        if headers.get('If-None-Match') == '"v1"':
+            return mock_response(None, status_code=304, headers={'ETag': '"v1"'})
+        return mock_response(example_content, headers={'ETag': '"v1"'})
+
+    mock_get(get)
+
+    event = Event.objects.create(data_url="http://localhost")
+    event.fetch()
+    assert event.etag == '"v1"'
+    assert event.content_hash
+
+    with django_assert_num_queries(3):
+        log = event.fetch()
+    assert requests_made[-1] == {'If-None-Match': '"v1"'}
+    assert log.state == 'ok'
+    assert log.content == {'action': 'update', 'fields': []}
+
+
+@pytest.mark.django_db
+def test_unchanged_content_hash(django_assert_num_queries, example_content, mock_response, mock_get):
+    def get(url, **kwargs):
+        return mock_response(example_content, url=url)
+
+    mock_get(get)
+
+    event = Event.objects.create(data_url="http://localhost")
+    event.fetch()
+    event.state = 'unreachable'
+    event.save()
+
+    with django_assert_num_queries(3):
+        log = event.fetch()
+    assert log.content == {'action': 'update', 'fields': []}
+    assert Event.objects.get(pk=event.pk).state == 'ok'
+
+
+@pytest.mark.django_db
+def test_update_writes_only_changed_fields(django_assert_num_queries, example_content):
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    first_log = event._update(example_content)
+    assert first_log.content == {'action': 'create'}
+
+    with django_assert_num_queries(3):
+        unchanged_log = event._update(example_content)
+    assert unchanged_log.content == {'action': 'update', 'fields': []}
+
+    with django_assert_num_queries(3):
+        assert event._update(example_content) == unchanged_log
+    assert event.logs.count() == 2
+
+    # The name is also written to the search index, and the catalogue
+    # version is bumped.
+    example_content['name'] = 'Closed Conference'
+    with django_assert_num_queries(5) as context:
+        log = event._update(example_content)
+    assert log.content == {'action': 'update', 'fields': ['name']}
+    update = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')][0]
+    assert '"name"' in update
+    assert '"description"' not in update
+    assert Event.objects.get(pk=event.pk).name == 'Closed Conference'
+
+
+@pytest.mark.django_db
+def test_update_coerces_values(example_content):
+    example_content['unknownField'] = 'ignored'
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(example_content)
+
+    event = Event.objects.get(pk=event.pk)
+    assert event.language_list == ['en']
+    assert event.start_date.isoformat() == '2019-05-20'
+    log = event._update(example_content)
+    assert log.content == {'action': 'update', 'fields': []}
+
+
+@pytest.mark.django_db
+def test_tags_and_languages_are_indexed(example_content):
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(example_content)
+    assert list(Event.objects.tagged('open').in_language('en')) == [event]
+
+    example_content['tags'] = ['closed']
+    event._update(example_content)
+    assert event.tag_list == ['closed']
+    assert not Event.objects.tagged('open').exists()
+    assert list(Event.objects.tagged('closed')) == [event]
+
+
+@pytest.mark.django_db
+def test_migration_indexes_legacy_languages():
+    # Languages used to be stored as str() of the list.
+    legacy = Event.objects.create(data_url="http://localhost", tags=',open,', languages="['en', 'de']")
+    current = Event.objects.create(data_url="http://localhost/current", languages=',en,')
+    migration = importlib.import_module('when.events.migrations.0010_event_tags_and_languages')
+    migration.fill_keywords(apps, None)
+    assert Event.objects.get(pk=legacy.pk).language_list == ['en', 'de']
+    assert list(Event.objects.in_language('de')) == [legacy]
+    assert set(Event.objects.in_language('en')) == {legacy, current}
+    assert list(Event.objects.tagged('open')) == [legacy]
+
+
+@pytest.mark.django_db
+def test_migration_repairs_legacy_languages():
+    legacy = Event.objects.create(data_url="http://localhost", languages="['en', 'de']")
+    legacy.event_languages.create(code="['en'")
+    migration = importlib.import_module('when.events.migrations.0018_repair_legacy_languages')
+    migration.repair_languages(apps, None)
+    assert Event.objects.get(pk=legacy.pk).languages == ',en,de,'
+    assert sorted(legacy.event_languages.values_list('code', flat=True)) == ['de', 'en']
+
+
+@pytest.mark.django_db
+def test_update_rejects_values_that_cannot_be_coerced(example_content):
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(example_content)
+    example_content['name'] = 'Closed Conference'
+    example_content['cfpDeadline'] = 'not a date'
+
+    log = event._update(example_content)
+
+    assert log.state == 'error'
+    assert log.content['error']['path'] == ['cfpDeadline']
+    event = Event.objects.get(pk=event.pk)
+    assert event.state == 'error'
+    assert event.name == 'Open Conference'
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+from django.core.cache import cache
+
+from when.events import feeds
+from when.events.feeds import _ical_line
+from when.events.models import Event
+
+
+@pytest.fixture
+def event(example_content):
+    cache.clear()
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(example_content)
+    return event
+
+
+def content(response):
+    return b''.join(response.streaming_content if response.streaming else [response.content]).decode()
+
+
+@pytest.mark.django_db
+def test_ical_feed(client, event):
+    response = client.get('/feed/events.ics')
+    assert response['Content-Type'] == 'text/calendar; charset=utf-8'
+    body = content(response)
+    assert body.count('BEGIN:VEVENT') == 2
+    assert 'DTSTART;VALUE=DATE:20190520\r\n' in body
+    assert 'DTEND;VALUE=DATE:20190524\r\n' in body
+    assert 'SUMMARY:CfP deadline: Open Conference\r\n' in body
+    assert 'DTSTART:20190120T000000Z\r\n' in body
+    assert 'LOCATION:Venue Venue\\, Berlin\r\n' in body
+
+
+@pytest.mark.django_db
+def test_json_feed(client, event):
+    data = json.loads(content(client.get('/feed/new')))
+    assert data['items'][0]['title'] == 'Open Conference'
+    assert data['items'][0]['tags'] == ['foo', 'bar', 'open', 'conference']
+    assert data['items'][0]['_when_events']['startDate'] == '2019-05-20'
+
+
+@pytest.mark.django_db
+def test_feed_caching_and_etag(client, event, django_assert_num_queries, example_content):
+    response = client.get('/feed/new')
+    assert response.streaming
+    first = content(response)
+    etag = response['ETag']
+
+    with django_assert_num_queries(1):
+        response = client.get('/feed/new')
+    assert not response.streaming
+    assert content(response) == first
+
+    with django_assert_num_queries(1):
+        response = client.get('/feed/new', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    example_content['name'] = 'Closed Conference'
+    event._update(example_content)
+    response = client.get('/feed/new', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert 'Closed Conference' in content(response)
+
+
+def test_ical_line_folding():
+    line = _ical_line('DESCRIPTION', 'ä' * 100)
+    assert all(len(part.encode()) <= 75 for part in line.rstrip('\r\n').split('\r\n'))
+    assert line.replace('\r\n ', '').rstrip('\r\n') == 'DESCRIPTION:' + 'ä' * 100
+
+
+@pytest.mark.django_db
+def test_update_feed(client, event, example_content):
+    event._update(example_content)  # unchanged
+    event._fail('Not found', state='unreachable')
+    example_content['name'] = 'Closed Conference'
+    event._update(example_content)
+
+    data = client.get('/feed/updates').json()
+    assert [change['action'] for change in data['changes']] == ['create', 'update']
+    assert data['changes'][0]['event'] == 'opencon'
+    assert data['changes'][1]['fields'] == ['name']
+    assert data['more'] is False
+
+    first = client.get('/feed/updates', {'limit': 1}).json()
+    assert len(first['changes']) == 1
+    assert first['more'] is True
+    second = client.get('/feed/updates', {'since': first['next']}).json()
+    assert second['changes'] == data['changes'][1:]
+    assert client.get('/feed/updates', {'since': second['next']}).json()['changes'] == []
+
+    since = data['changes'][1]['timestamp']
+    latest = client.get('/feed/updates', {'since': since}).json()
+    assert latest['changes'] == []
+    assert latest['next'] == data['changes'][1]['id']
+    assert client.get('/feed/updates', {'since': latest['next']}).json()['changes'] == []
+    assert client.get('/feed/updates', {'since': '2000-01-01T00:00:00Z'}).json()['changes'] == data['changes']
+
+
+@pytest.mark.django_db
+def test_update_feed_invalid_parameters(client):
+    assert client.get('/feed/updates', {'since': 'yesterday'}).status_code == 400
+    assert client.get('/feed/updates', {'limit': 'all'}).status_code == 400
+    assert client.get('/feed/updates', {'limit': 'inf'}).status_code == 400
+    assert client.get('/feed/updates', {'wait': 'nan'}).status_code == 400
+    assert client.get('/feed/updates', {'wait': 'inf'}).status_code == 400
+    assert client.get('/feed/updates', {'wait': '-inf'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_catalogue_version(event, example_content, django_assert_num_queries):
+    with django_assert_num_queries(1) as context:
+        version = feeds.get_version()
+    assert 'events_event' not in context.captured_queries[0]['sql']
+
+    event._update(example_content)
+    assert feeds.get_version() == version
+    example_content['name'] = 'Closed Conference'
+    event._update(example_content)
+    changed = feeds.get_version()
+    assert changed != version
+    event.delete()
+    assert feeds.get_version() != changed
@@ -0,0 +1,72 @@
+import socket
+import time
+
+import pytest
+import requests
+
+from when.events import client, hosts
+from when.events.models import Event
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(hosts.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    hosts.reset()
+    yield 'http://127.0.0.1:{}'.format(port)
+    hosts.reset()
+
+
+def test_token_bucket(clock):
+    bucket = hosts.TokenBucket(rate=2, burst=2)
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock[0] += 1
+    assert bucket.reserve() == 0.5
+    clock[0] += 10
+    assert bucket.reserve() == 0
+
+
+def test_circuit_breaker(clock):
+    breaker = hosts.CircuitBreaker(threshold=2, cooldown=60)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+    assert breaker.retry_after() == 60
+
+    clock[0] += 60
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+
+    clock[0] += 60
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.allow() and breaker.allow()
+
+
+@pytest.mark.django_db
+def test_open_circuit_fails_fast(closed_port, settings):
+    settings.WHEN_FETCH_BREAKER_THRESHOLD = 2
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.get(closed_port + '/event.json')
+    with pytest.raises(client.HostUnavailable):
+        client.get(closed_port + '/other.json')
+
+    event = Event.objects.create(data_url=closed_port + '/event.json', state='new')
+    start = time.monotonic()
+    log = event.fetch()
+    assert time.monotonic() - start < 0.5
+    assert log.state == 'unreachable'
+    assert 'is unavailable' in log.content['error']
@@ -0,0 +1,73 @@
+import pytest
+import pytz
+from django.utils.timezone import now
+
+from when.events import calendar
+from when.events.models import Event, Log
+
+
+@pytest.fixture
+def events():
+    for index in range(20):
+        event = Event.objects.create(data_url='http://{}.example'.format(index), state='ok')
+        Log.objects.create(event=event, state='ok', content={'action': 'create'})
+    return Event.objects.all()
+
+
+@pytest.mark.django_db
+def test_log_list_uses_timestamp_index(events):
+    assert 'log_timestamp' in Log.objects.order_by('-timestamp')[:100].explain()
+
+
+@pytest.mark.django_db
+def test_event_log_uses_event_timestamp_index(events):
+    event = events.first()
+    assert 'log_event_timestamp' in event.logs.order_by('-timestamp')[:10].explain()
+
+
+@pytest.mark.django_db
+def test_open_cfps_use_state_cfp_deadline_index(events):
+    assert 'event_state_cfp_deadline' in (
+        Event.objects.filter(state='ok', cfp_deadline__gte=now()).order_by('cfp_deadline').explain()
+    )
+
+
+@pytest.mark.django_db
+def test_calendar_uses_start_date_index(events):
+    today = now().date()
+    assert 'event_start_date' in Event.objects.filter(start_date__gte=today).order_by('start_date').explain()
+
+
+@pytest.mark.django_db
+def test_review_queue_uses_needs_review_index(events):
+    assert 'event_needs_review' in Event.objects.filter(needs_review=True).explain()
+
+
+@pytest.mark.django_db
+def test_due_events_use_next_check_at_index(events):
+    assert 'next_check_at' in Event.objects.filter(next_check_at__lte=now()).explain()
+
+
+@pytest.mark.django_db
+def test_log_list_query_count(events, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        list(Log.objects.select_related('event').order_by('-timestamp')[:100])
+
+
+@pytest.mark.django_db
+def test_tag_and_language_filters_use_indexes(events):
+    plan = Event.objects.tagged('python').in_language('en').explain()
+    assert 'events_eventtag_name_event_id' in plan
+    assert 'events_eventlanguage_code_event_id' in plan
+
+
+@pytest.mark.django_db
+def test_calendar_months_use_index(events):
+    today = now().date()
+    assert 'events_eventmonth_month_event_id' in calendar.get_events(today, today).explain()
+
+
+@pytest.mark.django_db
+def test_calendar_cfps_use_cfp_deadline_index(events):
+    today = now().date()
+    assert 'event_cfp_deadline' in calendar.get_cfps(today, today, pytz.utc).explain()
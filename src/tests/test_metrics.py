@@ -0,0 +1,99 @@
+from collections import defaultdict
+
+import pytest
+from django.core.management import call_command
+
+from when.events import metrics
+from when.events.models import Event
+
+
+def test_histogram_and_counter_rendering(monkeypatch):
+    monkeypatch.setattr(metrics, 'REGISTRY', [])
+    histogram = metrics.Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1), labels=('stage',))
+    counter = metrics.Counter('test_total', 'Test counter.', labels=('state',))
+    histogram.observe(0.05, stage='parse')
+    histogram.observe(0.1, stage='parse')
+    histogram.observe(5, stage='parse')
+    counter.inc(state='ok')
+    counter.inc(2, state='error')
+    assert metrics.render().splitlines() == [
+        '# HELP test_seconds Test histogram.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{stage="parse",le="0.1"} 2',
+        'test_seconds_bucket{stage="parse",le="1.0"} 2',
+        'test_seconds_bucket{stage="parse",le="+Inf"} 3',
+        'test_seconds_sum{stage="parse"} 5.15',
+        'test_seconds_count{stage="parse"} 3',
+        '# HELP test_total Test counter.',
+        '# TYPE test_total counter',
+        'test_total{state="error"} 2',
+        'test_total{state="ok"} 1',
+    ]
+
+
+@pytest.fixture
+def fresh_metrics(monkeypatch):
+    for metric in metrics.REGISTRY:
+        monkeypatch.setattr(metric, 'values', defaultdict(int) if isinstance(metric, metrics.Counter) else {})
+
+
+def test_export_merge_and_restore(monkeypatch):
+    monkeypatch.setattr(metrics, 'REGISTRY', [])
+    histogram = metrics.Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1))
+    counter = metrics.Counter('test_total', 'Test counter.', labels=('state',))
+    histogram.observe(0.5)
+    counter.inc(state='ok')
+    first = metrics.take()
+    assert first == {'test_seconds': [[[], [[0, 1, 0], 0.5]]], 'test_total': [[['ok'], 1]]}
+    assert metrics.take() == {'test_seconds': [], 'test_total': []}
+
+    counter.inc(2, state='ok')
+    total = metrics.merge(first, metrics.take())
+    assert total['test_total'] == [[['ok'], 3]]
+    metrics.restore(total)
+    counter.inc(state='error')
+    assert 'test_total{state="ok"} 6' in metrics.render(total)
+    assert 'test_total{state="error"} 1' in metrics.render(total)
+
+
+@pytest.mark.django_db
+def test_metrics_access(client, settings, django_user_model):
+    assert client.get('/metrics').status_code == 403
+    settings.WHEN_METRICS_TOKEN = 'secret'
+    assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code == 403
+    assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code == 200
+    user = django_user_model.objects.create_user(email='staff@example.com', password='password')
+    user.is_staff = True
+    user.save()
+    client.force_login(user)
+    assert client.get('/metrics').status_code == 200
+
+
+@pytest.mark.django_db
+def test_fetch_is_instrumented(fresh_metrics, client, settings, example_content, mock_get, mock_response):
+    settings.WHEN_METRICS_TOKEN = 'secret'
+    mock_get(lambda url, **kwargs: mock_response(example_content))
+    Event.objects.create(data_url="http://localhost", state='new').fetch()
+    mock_get(lambda url, **kwargs: mock_response({}, status_code=404))
+    Event.objects.create(data_url="http://localhost/404", state='new').fetch()
+
+    body = client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+    assert 'when_fetch_results_total{state="ok"} 1' in body
+    assert 'when_fetch_results_total{state="unreachable"} 1' in body
+    for stage in ('parse', 'validate', 'save'):
+        assert 'when_fetch_stage_seconds_count{{stage="{}"}}'.format(stage) in body
+
+
+@pytest.mark.django_db
+def test_metrics_of_commands_are_shown(fresh_metrics, client, settings, example_content, mock_get, mock_response):
+    settings.WHEN_METRICS_TOKEN = 'secret'
+    mock_get(lambda url, **kwargs: mock_response(example_content))
+    Event.objects.create(data_url="http://localhost", state='new')
+    call_command('refresh_events')
+    call_command('refresh_events')
+    # What the command exported is not counted in this process any longer.
+    assert metrics.FETCH_RESULTS.snapshot() == {}
+
+    body = client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+    assert 'when_fetch_results_total{state="ok"} 2' in body
+    assert 'when_fetch_stage_seconds_count{stage="batch_save"} 2' in body
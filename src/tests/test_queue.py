@@ -0,0 +1,90 @@
+import pytest
+from django.core.management import call_command
+
+from when.events import queue
+from when.events.models import Event, FetchJob
+
+
+@pytest.fixture
+def remote(example_content, mock_response, mock_get):
+    requested = []
+
+    def get(url, **kwargs):
+        requested.append(url)
+        return mock_response(example_content)
+
+    mock_get(get)
+    return requested
+
+
+@pytest.mark.django_db
+def test_submission_is_queued_and_coalesced(client, remote):
+    for _ in range(3):
+        response = client.post('/', {'url': 'https://example.com/event.json'})
+        assert response.status_code == 302
+    assert remote == []
+
+    event = Event.objects.get()
+    assert event.state == 'new'
+    log = event.logs.get()
+    assert response['Location'].endswith('#log-{}'.format(log.id))
+    assert FetchJob.objects.count() == 1
+
+    call_command('process_queue', '--once')
+    assert remote == ['https://example.com/event.json']
+    event.refresh_from_db()
+    assert event.state == 'ok'
+    assert not FetchJob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_submission_while_running_requeues(remote):
+    event = Event.objects.create(data_url='http://localhost', state='new')
+    assert queue.enqueue(event) is True
+    job, = queue.claim()
+    assert queue.claim() == []
+
+    assert queue.enqueue(event) is False
+    event.fetch()
+    queue.finish(job)
+    job = FetchJob.objects.get()
+    assert job.started_at is None
+    assert not job.requeue
+
+    assert len(queue.process()) == 1
+    assert not FetchJob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_invalid_urls_are_rejected(client, remote):
+    for url in ('http://[::1/event.json', 'ftp://example.com/event.json', 'http://', 'https://' + 'a' * 200 + '.com'):
+        response = client.post('/', {'url': url})
+        assert response.status_code == 200
+        assert 'This URL is invalid' in response.content.decode()
+    assert not Event.objects.exists()
+    assert client.post('/', {}).status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failing_jobs_are_finished(remote, monkeypatch):
+    for index in range(3):
+        queue.enqueue(Event.objects.create(data_url='http://localhost/{}'.format(index), state='new'))
+    Event.objects.filter(data_url='http://localhost/1').update(data_url='http://[::1/event.json')
+
+    results = queue.process()
+
+    states = {event.data_url: log.state for event, log in results}
+    assert len(states) == 3
+    assert states['http://[::1/event.json'] == 'error'
+    assert 'ok' in states.values()
+    assert not FetchJob.objects.exists()
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('Database is gone')
+        yield
+
+    queue.enqueue(Event.objects.first())
+    monkeypatch.setattr(queue, 'refresh_events', broken)
+    with pytest.raises(RuntimeError):
+        queue.process()
+    assert not FetchJob.objects.exists()
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+import requests
+from django.core.management import call_command
+
+from when.events import metrics
+from when.events.models import Event, Log
+from when.events.refresh import refresh_events
+
+
+@pytest.mark.django_db
+def test_refresh_events_states_and_logs(example_content, mock_response, mock_get):
+    def get(url, **kwargs):
+        if 'broken' in url:
+            return mock_response({}, status_code=404)
+        if 'offline' in url:
+            raise requests.ConnectionError('Connection refused')
+        content = dict(example_content, shortName=url.rsplit('/', 1)[-1])
+        return mock_response(content)
+
+    mock_get(get)
+    for name in ('one', 'two', 'three'):
+        Event.objects.create(data_url='http://a.example/' + name, state='new')
+    Event.objects.create(data_url='http://b.example/broken', state='new')
+    Event.objects.create(data_url='http://c.example/offline', state='new')
+
+    results = list(refresh_events(Event.objects.all(), workers=3, per_host=1))
+
+    assert len(results) == 5
+    states = {event.data_url: log.state for event, log in results}
+    assert states['http://a.example/one'] == 'ok'
+    assert states['http://b.example/broken'] == 'unreachable'
+    assert states['http://c.example/offline'] == 'unreachable'
+    assert Event.objects.filter(state='ok').count() == 3
+    assert [log.content for log in Log.objects.filter(state='ok')] == [{'action': 'create'}] * 3
+    assert Event.objects.get(data_url='http://a.example/two').short_name == 'two'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_events_survives_broken_events(example_content, mock_response, mock_get):
+    def get(url, **kwargs):
+        if 'array' in url:
+            return mock_response([example_content])
+        name = url.rsplit('/', 1)[-1]
+        return mock_response(dict(example_content, shortName='duplicate' if 'duplicate' in name else name))
+
+    mock_get(get)
+    for url in (
+        'http://a.example/one', 'http://[::1/event.json', 'http://a.example/array',
+        'http://a.example/duplicate1', 'http://a.example/duplicate2', 'http://a.example/two',
+    ):
+        Event.objects.create(data_url=url, state='new')
+
+    results = list(refresh_events(Event.objects.all(), workers=1, per_host=1))
+
+    assert len(results) == 6
+    states = {event.data_url: log.state for event, log in results}
+    assert states['http://a.example/one'] == states['http://a.example/two'] == 'ok'
+    assert states['http://[::1/event.json'] == 'error'
+    assert states['http://a.example/array'] == 'error'
+    assert sorted([states['http://a.example/duplicate1'], states['http://a.example/duplicate2']]) == ['error', 'ok']
+    assert Event.objects.filter(state='ok').count() == 3
+    assert Event.objects.filter(state='error').count() == 3
+    assert Log.objects.get(event__data_url='http://a.example/array').content['error'] == (
+        'The document must be a JSON object.'
+    )
+
+
+@pytest.mark.django_db
+def test_refresh_events_limits_requests_per_host(example_content, mock_response, mock_get):
+    lock = threading.Lock()
+    current = defaultdict(int)
+    peak = defaultdict(int)
+
+    def get(url, **kwargs):
+        host = url.split('/')[2]
+        with lock:
+            current[host] += 1
+            peak[host] = max(peak[host], current[host])
+        time.sleep(0.02)
+        with lock:
+            current[host] -= 1
+        return mock_response(dict(example_content, shortName=url.rsplit('/', 1)[-1]))
+
+    mock_get(get)
+    for index in range(6):
+        Event.objects.create(data_url='http://a.example/a{}'.format(index), state='new')
+        Event.objects.create(data_url='http://b.example/b{}'.format(index), state='new')
+
+    results = list(refresh_events(Event.objects.all(), workers=6, per_host=2))
+
+    assert len(results) == 12
+    assert peak == {'a.example': 2, 'b.example': 2}
+
+
+@pytest.mark.django_db
+def test_refresh_events_command(example_content, capsys, mock_get, mock_response):
+    mock_get(lambda url, **kwargs: mock_response(example_content))
+    Event.objects.create(data_url='http://a.example/event.json', state='new')
+
+    call_command('refresh_events')
+
+    assert 'Refreshed 1 events (1 ok).' in capsys.readouterr().out
+    assert Event.objects.get().state == 'ok'
+
+
+@pytest.mark.django_db
+def test_refresh_events_in_batches(example_content, django_assert_num_queries, mock_response, mock_get):
+    def get(url, **kwargs):
+        if 'broken' in url:
+            return mock_response({}, status_code=500)
+        return mock_response(dict(example_content, shortName=url.rsplit('/', 1)[-1]))
+
+    mock_get(get)
+    for name in ('one', 'two', 'three', 'broken'):
+        Event.objects.create(data_url='http://a.example/' + name, state='new')
+
+    # Loading the events, the log history and a save per event in a
+    # savepoint of its own, and per batch one log insert plus the savepoint
+    # and its release. The first batch also looks up and inserts the tags
+    # and languages of the three new events and their months, adds them to
+    # the search index and bumps the catalogue version.
+    with django_assert_num_queries(31) as context:
+        results = list(refresh_events(Event.objects.all(), workers=1, batch_size=3))
+
+    inserts = [query['sql'] for query in context.captured_queries if query['sql'].startswith('INSERT INTO "events_log"')]
+    assert len(inserts) == 2
+    assert len(results) == 4
+    assert Event.objects.filter(state='ok').count() == 3
+    assert Event.objects.get(data_url='http://a.example/broken').state == 'unreachable'
+    assert sorted(log.state for log in Log.objects.all()) == ['ok', 'ok', 'ok', 'unreachable']
+
+
+@pytest.mark.django_db
+def test_refresh_events_batch_survives_failing_saves(monkeypatch, example_content, mock_response, mock_get):
+    monkeypatch.setattr(metrics.FETCH_RESULTS, 'values', defaultdict(int))
+
+    def get(url, **kwargs):
+        name = url.rsplit('/', 1)[-1]
+        return mock_response(dict(example_content, shortName='duplicate' if 'duplicate' in name else name))
+
+    mock_get(get)
+    for name in ('one', 'duplicate1', 'duplicate2', 'two'):
+        Event.objects.create(data_url='http://a.example/' + name, state='new')
+
+    results = list(refresh_events(Event.objects.all(), workers=1, batch_size=10))
+
+    assert sorted(log.state for event, log in results) == ['error', 'ok', 'ok', 'ok']
+    assert Event.objects.filter(state='ok').count() == 3
+    failed = Event.objects.get(state='error')
+    assert failed.short_name is None
+    assert 'IntegrityError' in failed.logs.get().content['error']
+    assert Log.objects.filter(state='ok').count() == 3
+    # The failed save is counted as an error only.
+    assert metrics.FETCH_RESULTS.snapshot() == {('ok',): 3, ('error',): 1}
+
+
+@pytest.mark.django_db
+def test_refresh_events_schedules_next_check(example_content, mock_get, mock_response):
+    mock_get(lambda url, **kwargs: mock_response(example_content))
+    event = Event.objects.create(data_url='http://a.example/event.json', state='new')
+
+    call_command('refresh_events', due=True)
+
+    event.refresh_from_db()
+    assert event.next_check_at is not None
+    assert not Event.objects.due().exists()
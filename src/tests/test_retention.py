@@ -0,0 +1,91 @@
+import datetime as dt
+
+import pytest
+from django.core.management import call_command
+from django.utils.timezone import now
+
+from when.events.models import Event, Log
+from when.events.retention import compact_logs
+
+
+def create_logs(event, *outcomes):
+    start = now() - dt.timedelta(days=len(outcomes))
+    logs = []
+    for index, (state, content) in enumerate(outcomes):
+        log = Log.objects.create(event=event, state=state, content=content)
+        # Log.timestamp is set automatically on creation.
+        log.timestamp = start + dt.timedelta(days=index)
+        log.save(update_fields=['timestamp'])
+        logs.append(log)
+    return logs
+
+
+@pytest.mark.django_db
+def test_compact_collapses_identical_outcomes():
+    event = Event.objects.create(data_url='http://localhost', state='error')
+    error = ('error', {'content': 'nope', 'error': 'Expecting value'})
+    logs = create_logs(event, ('ok', {'action': 'create'}), error, error, error, ('ok', {'action': 'update', 'fields': ['name']}))
+
+    stats = compact_logs(max_age=365, keep=10)
+
+    assert stats['collapsed'] == 2
+    remaining = list(event.logs.order_by('pk'))
+    assert [log.pk for log in remaining] == [logs[0].pk, logs[3].pk, logs[4].pk]
+    assert remaining[1].count == 3
+    assert remaining[1].first_timestamp == logs[1].timestamp
+    assert remaining[1].timestamp == logs[3].timestamp
+
+
+@pytest.mark.django_db
+def test_compaction_keeps_the_backoff():
+    event = Event.objects.create(data_url='http://localhost', state='unreachable')
+    failure = ('unreachable', {'content': None, 'error': 500})
+    create_logs(event, ('ok', {'action': 'create'}), failure, failure, failure)
+    compact_logs(max_age=365, keep=10)
+
+    before = now()
+    event._fail(500, state='unreachable')
+    # Four failures in a row: 2 ** 4 hours.
+    assert event.next_check_at - before >= dt.timedelta(hours=16)
+    assert event.next_check_at - before < dt.timedelta(hours=16, minutes=1)
+
+
+@pytest.mark.django_db
+def test_compact_truncates_large_content(settings):
+    settings.WHEN_LOG_MAX_CONTENT_SIZE = 10
+    event = Event.objects.create(data_url='http://localhost', state='error')
+    create_logs(event, ('error', {'content': 'x' * 100, 'error': 'Expecting value'}))
+
+    assert compact_logs(max_age=365, keep=10)['shrunk'] == 1
+
+    content = event.logs.get().content
+    assert content['content'] == 'x' * 10
+    assert content['content_length'] == 100
+    assert len(content['content_sha256']) == 64
+
+
+@pytest.mark.django_db
+def test_compact_prunes_old_entries_but_keeps_latest():
+    event = Event.objects.create(data_url='http://localhost', state='ok')
+    logs = create_logs(event, *[('ok', {'action': 'update', 'fields': [str(index)]}) for index in range(10)])
+
+    assert compact_logs(max_age=5, keep=3)['pruned'] == 6
+
+    assert list(event.logs.order_by('pk').values_list('pk', flat=True)) == [log.pk for log in logs[6:]]
+    assert compact_logs(max_age=0, keep=3, chunk_size=1)['pruned'] == 1
+    assert event.logs.count() == 3
+
+
+@pytest.mark.django_db
+def test_compact_logs_command(capsys):
+    call_command('compact_logs', pause=0.01)
+    assert 'Collapsed 0, truncated 0 and deleted 0 log entries.' in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_unchanged_polls_are_counted():
+    event = Event.objects.create(data_url='http://localhost', state='ok')
+    create_logs(event, ('ok', {'action': 'update', 'fields': []}))
+    log = event._log_unchanged()
+    assert log.count == 2
+    assert log.first_timestamp is not None
@@ -0,0 +1,65 @@
+import datetime as dt
+
+import pytest
+from django.utils.timezone import now
+
+from when.events import schedule
+from when.events.models import Event
+
+CURRENT = now()
+
+
+def history(*entries):
+    return [(state, content, CURRENT - age, count) for state, content, age, count in (
+        entry + (1,) if len(entry) == 3 else entry for entry in entries
+    )]
+
+
+def test_recently_changed_events_are_checked_often():
+    event = Event(end_date=(now() + dt.timedelta(days=300)).date())
+    interval = schedule.get_interval(event, history(
+        ('ok', {'action': 'update', 'fields': []}, dt.timedelta(0)),
+        ('ok', {'action': 'update', 'fields': ['name']}, dt.timedelta(hours=8)),
+    ), CURRENT)
+    assert interval == dt.timedelta(hours=2)
+
+
+def test_static_events_back_off():
+    event = Event(end_date=(now() + dt.timedelta(days=300)).date())
+    interval = schedule.get_interval(event, history(
+        ('ok', {'action': 'update', 'fields': []}, dt.timedelta(0)),
+        ('ok', {'action': 'create'}, dt.timedelta(days=90)),
+    ), CURRENT)
+    assert interval == schedule.MAX_INTERVAL
+
+
+def test_failing_events_back_off_exponentially():
+    event = Event()
+    failures = [('unreachable', {'error': 500}, dt.timedelta(hours=hours)) for hours in range(3)]
+    assert schedule.get_interval(event, history(*failures), CURRENT) == dt.timedelta(hours=8)
+    failures *= 5
+    assert schedule.get_interval(event, history(*failures), CURRENT) == schedule.MAX_INTERVAL
+    collapsed = ('unreachable', {'error': 500}, dt.timedelta(0), 3)
+    assert schedule.get_interval(event, history(collapsed), CURRENT) == dt.timedelta(hours=8)
+
+
+def test_cfp_deadline_and_past_events():
+    event = Event(
+        cfp_deadline=now() + dt.timedelta(days=3),
+        start_date=(now() + dt.timedelta(days=100)).date(),
+        end_date=(now() + dt.timedelta(days=101)).date(),
+    )
+    unchanged = history(('ok', {'action': 'update', 'fields': []}, dt.timedelta(0)))
+    assert schedule.get_interval(event, unchanged, CURRENT) == schedule.CFP_INTERVAL
+    event.end_date = (now() - dt.timedelta(days=1)).date()
+    assert schedule.get_interval(event, unchanged, CURRENT) == schedule.PAST_INTERVAL
+
+
+@pytest.mark.django_db
+def test_due_events():
+    current = now()
+    overdue = Event.objects.create(data_url='http://a.example', next_check_at=current - dt.timedelta(hours=2))
+    due = Event.objects.create(data_url='http://b.example', next_check_at=current - dt.timedelta(hours=1))
+    Event.objects.create(data_url='http://c.example', next_check_at=current + dt.timedelta(hours=1))
+    unscheduled = Event.objects.create(data_url='http://d.example')
+    assert list(Event.objects.due(current)) == [unscheduled, overdue, due]
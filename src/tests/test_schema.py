@@ -0,0 +1,70 @@
+import json
+import shutil
+
+import pytest
+from jsonschema import ValidationError
+
+from when import schema
+from when.events import api
+from when.events.mapping import get_plan
+from when.events.models import Event
+
+
+def test_validators_are_cached():
+    assert schema.VERSIONS == ['0.1.0']
+    assert schema.get_validator('0.1.0') is schema.get_validator('0.1.0')
+    assert schema.get_schema('0.1.0') is schema.get_schema('0.1.0')
+
+
+def test_validate(example_content):
+    schema.validate(example_content, '0.1.0')
+    example_content.pop('name')
+    with pytest.raises(ValidationError):
+        schema.validate(example_content, '0.1.0')
+
+
+def test_reload_picks_up_new_versions(tmp_path, monkeypatch):
+    shutil.copy(schema.SCHEMA_DIR + '/schema-0.1.0.json', str(tmp_path / 'schema-0.1.0.json'))
+    shutil.copy(schema.SCHEMA_DIR + '/schema-0.1.0.json', str(tmp_path / 'schema-0.10.0.json'))
+    shutil.copy(schema.SCHEMA_DIR + '/schema-0.1.0.json', str(tmp_path / 'schema-0.2.0.json'))
+    old_validator = schema.get_validator('0.1.0')
+    monkeypatch.setattr(schema, 'SCHEMA_DIR', str(tmp_path))
+    try:
+        schema.reload()
+        assert schema.VERSIONS == ['0.1.0', '0.2.0', '0.10.0']
+        assert schema.get_validator('0.1.0') is not old_validator
+    finally:
+        monkeypatch.undo()
+        schema.reload()
+    assert schema.VERSIONS == ['0.1.0']
+
+
+def test_reload_rebuilds_the_plans(tmp_path, monkeypatch):
+    with open(schema.get_schema_path('0.1.0')) as f:
+        edited = json.load(f)
+    del edited['properties']['location']
+    with open(str(tmp_path / 'schema-0.1.0.json'), 'w') as f:
+        json.dump(edited, f)
+    assert 'location' in get_plan('0.1.0', Event)
+    monkeypatch.setattr(schema, 'SCHEMA_DIR', str(tmp_path))
+    try:
+        schema.reload()
+        assert 'location' not in get_plan('0.1.0', Event)
+        assert 'location' not in [key for key, attribute, convert in api._get_serialization_plan('0.1.0')]
+    finally:
+        monkeypatch.undo()
+        schema.reload()
+    assert 'location' in get_plan('0.1.0', Event)
+
+
+def test_check_reports_all_errors_and_caches(monkeypatch, example_content):
+    assert schema.check(example_content) == []
+    example_content.pop('name')
+    example_content['startDate'] = 5
+    errors = schema.check(example_content)
+    assert len(errors) == 2
+    assert ['startDate'] in [error['path'] for error in errors]
+
+    monkeypatch.setattr(schema, 'get_validator', None)
+    assert schema.check(dict(example_content)) is errors
+    assert schema.check({'version': 'foo'})[0]['path'] == ['version']
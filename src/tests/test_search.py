@@ -0,0 +1,70 @@
+import pytest
+
+from when.events import geo
+from when.events.models import Event
+
+
+@pytest.fixture
+def events():
+    places = {
+        'berlin': (52.52, 13.405),
+        'potsdam': (52.39, 13.065),
+        'paris': (48.857, 2.352),
+        'suva': (-18.124, 178.45),
+        'apia': (-13.833, -171.767),
+    }
+    return {
+        name: Event.objects.create(
+            data_url='http://{}.example'.format(name), state='ok', name=name, short_name=name,
+            latitude=latitude, longitude=longitude,
+        )
+        for name, (latitude, longitude) in places.items()
+    }
+
+
+def test_bounding_box():
+    assert geo.bounding_box(0, 179, 500)[1] > geo.bounding_box(0, 179, 500)[3]
+    assert geo.bounding_box(89, 0, 500) == (89 - 500 / geo.KM_PER_DEGREE, -180, 90, 180)
+    assert round(geo.distance(52.52, 13.405, 48.857, 2.352)) == 877
+
+
+@pytest.mark.django_db
+def test_near(events):
+    assert list(Event.objects.near(52.5, 13.4, 50)) == [events['berlin'], events['potsdam']]
+    assert list(Event.objects.near(52.4, 13.0, 50)) == [events['potsdam'], events['berlin']]
+    assert list(Event.objects.near(52.5, 13.4, 1000)) == [events['berlin'], events['potsdam'], events['paris']]
+    # Across the antimeridian
+    assert list(Event.objects.near(-16, -178, 1500)) == [events['suva'], events['apia']]
+
+
+@pytest.mark.django_db
+def test_within_box(events):
+    assert set(Event.objects.within_box(40, 0, 60, 20)) == {events['berlin'], events['potsdam'], events['paris']}
+    assert set(Event.objects.within_box(-20, 170, -10, -170)) == {events['suva'], events['apia']}
+
+
+@pytest.mark.django_db
+def test_near_uses_coordinates_index(events):
+    assert 'event_coordinates' in Event.objects.near(52.5, 13.4, 50).explain()
+
+
+@pytest.mark.django_db
+def test_search_api(client, events):
+    data = client.get('/api/events/search', {'lat': 52.5, 'lon': 13.4, 'radius': 50}).json()
+    assert [event['shortName'] for event in data['events']] == ['berlin', 'potsdam']
+    assert data['events'][0]['distance'] < 5
+
+    data = client.get('/api/events/search', {'bbox': '40,0,60,20', 'lat': 48.8, 'lon': 2.3}).json()
+    assert [event['shortName'] for event in data['events']] == ['paris', 'potsdam', 'berlin']
+
+    assert client.get('/api/events/search', {'lat': 'north'}).status_code == 400
+    assert client.get('/api/events/search', {'lat': 100, 'lon': 0}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_coordinates_are_imported_as_numbers(example_content):
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(example_content)
+    event = Event.objects.get(pk=event.pk)
+    assert event.coordinates == [52.52067985, 13.4164507938843]
+    assert event._update(example_content).content == {'action': 'update', 'fields': []}
@@ -0,0 +1,89 @@
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+
+from when.events import search
+from when.events.models import Event
+
+
+@pytest.fixture
+def event(example_content):
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(example_content)
+    return event
+
+
+@pytest.mark.django_db
+def test_search_is_kept_in_sync(event, example_content):
+    events = Event.objects.all()
+    assert search.search(events, 'open conf') == [event]
+    assert search.search(events, 'berl') == [event]
+    assert search.search(events, 'closed') == []
+
+    example_content['name'] = 'Closed Conference'
+    event._update(example_content)
+    assert search.search(events, 'closed') == [event]
+    assert search.search(events, 'open conf') == [event]  # still tagged "open"
+    assert search.search(events, 'open closed') == [event]
+    assert search.search(events, '*"') == []
+
+
+@pytest.mark.django_db
+def test_search_ranking():
+    description = Event.objects.create(data_url='http://a.example', name='Meetup', description='About python')
+    name = Event.objects.create(data_url='http://b.example', name='PyCon', description='Python python python')
+    tag = Event.objects.create(data_url='http://c.example', name='Conference', tags=',python,')
+    search.update_index([description, name, tag])
+    assert search.search(Event.objects.all(), 'py') == [name, tag, description]
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index(event, capsys):
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(search.FTS_TABLE))
+    assert search.search(Event.objects.all(), 'open') == []
+    call_command('rebuild_search_index')
+    assert 'Indexed 1 events.' in capsys.readouterr().out
+    assert search.search(Event.objects.all(), 'open') == [event]
+
+
+@pytest.mark.django_db
+def test_migration_fills_the_index(event):
+    migration = importlib.import_module('when.events.migrations.0012_search_index')
+    with connection.cursor() as cursor:
+        # The SQLite schema editor cannot be used inside the test transaction.
+        schema_editor = SimpleNamespace(connection=connection, execute=cursor.execute)
+        migration.drop_index(apps, schema_editor)
+        migration.create_index(apps, schema_editor)
+    assert search.search(Event.objects.all(), 'open conf') == [event]
+    assert search.search(Event.objects.all(), 'berl') == [event]
+
+
+@pytest.mark.django_db
+def test_event_list_search(client, event):
+    response = client.get('/list', {'q': 'open'})
+    assert response.status_code == 200
+    assert list(response.context['events']) == [event]
+
+
+@pytest.mark.django_db
+def test_event_list_links_web_urls_only(client, example_content):
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    event._update(dict(example_content, urls={'home': 'javascript:alert(1)', 'cfp': 'https://example.com/cfp'}))
+    assert Event.objects.get(pk=event.pk).urls == {'cfp': 'https://example.com/cfp'}
+    body = client.get('/list', {'q': 'open'}).content.decode()
+    assert 'javascript:' not in body
+    assert 'href="http://localhost"' in body
+
+
+@pytest.mark.django_db
+def test_migration_drops_unsafe_urls(example_content):
+    event = Event.objects.create(data_url="http://localhost", state='new')
+    Event.objects.filter(pk=event.pk).update(urls={'home': 'JavaScript:alert(1)', 'cfp': 'http://example.com'})
+    migration = importlib.import_module('when.events.migrations.0017_event_web_urls')
+    migration.drop_unsafe_urls(apps, None)
+    assert Event.objects.get(pk=event.pk).urls == {'cfp': 'http://example.com'}
@@ -0,0 +1,88 @@
+import datetime as dt
+import json
+
+import pytest
+from django.core.cache import cache
+from django.utils.timezone import now
+
+from when.events.models import Event, Log
+from when.events.views import Docs, LogList, encode_cursor
+
+
+@pytest.fixture
+def logs():
+    event = Event.objects.create(data_url='http://localhost', state='ok', name='Open Conference')
+    start = now() - dt.timedelta(days=1)
+    return [
+        Log.objects.create(
+            event=event, state='ok', content={'action': 'update', 'fields': ['name']},
+            timestamp=start + dt.timedelta(minutes=index),
+        )
+        for index in range(5)
+    ]
+
+
+@pytest.mark.django_db
+def test_log_list_keyset_pagination(client, logs, monkeypatch, django_assert_num_queries):
+    monkeypatch.setattr(LogList, 'page_size', 2)
+
+    with django_assert_num_queries(2):
+        response = client.get('/log')
+    assert [log.id for log in response.context['logs']] == [logs[4].id, logs[3].id]
+    assert 'newer_url' not in response.context
+
+    response = client.get('/log' + response.context['older_url'])
+    assert [log.id for log in response.context['logs']] == [logs[2].id, logs[1].id]
+
+    response = client.get('/log' + response.context['older_url'])
+    assert [log.id for log in response.context['logs']] == [logs[0].id]
+    assert 'older_url' not in response.context
+
+    response = client.get('/log' + response.context['newer_url'])
+    assert [log.id for log in response.context['logs']] == [logs[2].id, logs[1].id]
+
+    response = client.get('/log?from=' + encode_cursor(logs[3]))
+    assert [log.id for log in response.context['logs']] == [logs[3].id, logs[2].id]
+
+
+@pytest.mark.django_db
+def test_log_list_invalid_cursor(client):
+    assert client.get('/log?before=foo').status_code == 404
+
+
+@pytest.mark.django_db
+def test_validator_api(client, example_content):
+    response = client.post('/api/validate', json.dumps(example_content), content_type='application/json')
+    assert response.json() == {'valid': True, 'errors': []}
+
+    invalid = dict(example_content, startDate=5)
+    invalid.pop('name')
+    response = client.post('/api/validate', json.dumps([example_content, invalid]), content_type='application/json')
+    results = response.json()['results']
+    assert [result['valid'] for result in results] == [True, False]
+    assert len(results[1]['errors']) == 2
+
+    body = '\n'.join([json.dumps(example_content), '{', json.dumps(invalid)]) + '\n'
+    response = client.post('/api/validate', body, content_type='application/x-ndjson')
+    assert response.streaming
+    results = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert [result['valid'] for result in results] == [True, False, False]
+    assert 'Could not parse data' in results[1]['errors'][0]['message']
+
+    assert client.post('/api/validate', '{', content_type='application/json').status_code == 400
+
+
+@pytest.mark.django_db
+def test_docs_are_cached(client, monkeypatch):
+    cache.clear()
+    response = client.get('/docs')
+    assert response.status_code == 200
+    assert b'Open Conference' in response.content
+    etag = response['ETag']
+
+    monkeypatch.setattr(Docs, 'get_context_data', None)
+    response = client.get('/docs')
+    assert response.status_code == 200
+    assert b'Open Conference' in response.content
+    assert client.get('/docs', HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert client.get('/docs', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code == 304
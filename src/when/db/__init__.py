@@ -0,0 +1,20 @@
+"""
+SQLite database backend for production use.
+
+Use ``'ENGINE': 'when.db'`` instead of ``django.db.backends.sqlite3`` to
+apply the PRAGMA statements given in ``OPTIONS['pragmas']`` to every new
+connection. The settings configure the write-ahead log, in which readers
+see the last committed state while a write transaction is running instead
+of waiting for it, a busy timeout, after which a waiting writer gives up
+with "database is locked", the synchronous level and the size of the
+memory-mapped I/O region.
+
+``OPTIONS['transaction_mode']`` sets how transactions are started: with
+``'IMMEDIATE'``, a transaction takes the write lock when it begins, waiting
+for it within the busy timeout. With the default deferred transactions,
+a transaction that reads and then writes fails at once if another
+connection committed in between, as SQLite cannot wait for the lock then.
+
+To send reads to a connection of their own, see
+:class:`when.db.router.ReadRouter`.
+"""
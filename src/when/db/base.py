@@ -0,0 +1,25 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured('Unknown SQLite transaction mode: {}'.format(mode))
+        self.cursor().execute('BEGIN {}'.format(mode))
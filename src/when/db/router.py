@@ -0,0 +1,30 @@
+from django.db import connections
+
+READ_ALIAS = 'read'
+WRITE_ALIAS = 'default'
+
+
+class ReadRouter:
+    """
+    Sends reads to the ``read`` connection and everything else to the
+    ``default`` connection. Both are expected to point to the same
+    database file, so that a page view reads from a connection of its own
+    while the refresher writes.
+
+    Inside a transaction of the default connection, reads stay on it, so
+    that they see the transaction's own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if connections[WRITE_ALIAS].in_atomic_block:
+            return WRITE_ALIAS
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return WRITE_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == WRITE_ALIAS
@@ -0,0 +1,121 @@
+"""
+Serialization of events for the read API, in the camelCase shape of the
+latest event schema.
+
+Serialized events are cached per event. The cache key contains the time
+of the event's last change, which ``Event._update`` sets only when the
+imported data changed, so a cached representation stays valid until then
+and unchanged polls keep it. Clients may ask for a subset of the keys;
+the cache always holds the complete representation.
+"""
+import json
+from datetime import date, datetime
+from itertools import islice
+
+from django.core.cache import cache
+
+from when import schema
+from when.events.mapping import get_plan
+from when.events.models import Event
+
+CACHE_TIMEOUT = 24 * 60 * 60
+CHUNK_SIZE = 500
+
+
+def get_fields():
+    """All keys of the serialized events, in schema order."""
+    return ['version'] + list(get_plan(schema.VERSIONS[-1], Event))
+
+
+@schema.derived
+def _get_serialization_plan(version):
+    """
+    ``(key, attribute, convert)`` per schema key. Numbers in arrays of
+    strings, like the coordinates, are converted to strings.
+    """
+    properties = schema.get_schema(version)['properties']
+    plan = []
+    for key, mapping in get_plan(version, Event).items():
+        definition = properties[key]
+        if definition.get('type') == 'array':
+            item_type = definition.get('items', {}).get('type')
+            convert = _serialize_string_list if item_type == 'string' else _serialize_list
+        else:
+            convert = _serialize_value
+        plan.append((key, mapping.attribute, convert))
+    return plan
+
+
+def _serialize_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _serialize_list(value):
+    if value is None:
+        return None
+    return [item for item in value if item not in ('', None)]
+
+
+def _serialize_string_list(value):
+    if value is None:
+        return None
+    return [str(item) for item in value if item not in ('', None)]
+
+
+def serialize(event):
+    """The complete representation of the event. Empty keys are left out."""
+    version = schema.VERSIONS[-1]
+    data = {'version': version}
+    for key, attribute, convert in _get_serialization_plan(version):
+        value = convert(getattr(event, attribute))
+        if value is not None:
+            data[key] = value
+    return data
+
+
+def get_cache_key(pk, last_changed):
+    return 'api:event:{}:{}:{}'.format(
+        schema.VERSIONS[-1], pk, int(last_changed.timestamp() * 1000000) if last_changed else 0
+    )
+
+
+def get_serialized(rows):
+    """
+    Returns the representations of the events given as ``(pk, last_changed)``
+    pairs, in the same order. Events that are not cached are loaded with one
+    query and added to the cache.
+    """
+    keys = [get_cache_key(pk, last_changed) for pk, last_changed in rows]
+    found = cache.get_many(keys)
+    missing = {pk: key for (pk, last_changed), key in zip(rows, keys) if key not in found}
+    if missing:
+        added = {missing[event.pk]: serialize(event) for event in Event.objects.filter(pk__in=missing)}
+        cache.set_many(added, CACHE_TIMEOUT)
+        found.update(added)
+    return [found[key] for key in keys if key in found]
+
+
+def select(data, fields=None):
+    if fields is None:
+        return data
+    return {key: data[key] for key in fields if key in data}
+
+
+def json_chunks(events, fields=None):
+    """
+    Renders the events as ``{"events": [...]}``, reading and serializing
+    ``CHUNK_SIZE`` events at a time.
+    """
+    rows = events.values_list('pk', 'last_changed').iterator(chunk_size=CHUNK_SIZE)
+    yield '{"events": ['
+    separator = ''
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        for data in get_serialized(chunk):
+            yield separator + json.dumps(select(data, fields))
+            separator = ', '
+    yield ']}'
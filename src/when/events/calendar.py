@@ -0,0 +1,73 @@
+"""
+Calendar queries: the events and CfP deadlines of a date range, and the
+number of events per month.
+
+Event dates are all-day dates, local to the event, so they are used as
+they are: events are bucketed into months via the indexed EventMonth
+table, and the dates are only compared for the months at the edges of the
+range. CfP deadlines are points in time, and are selected and shown in
+the viewer's timezone, through the index on the deadline.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from when.events import feeds
+from when.events.models import Event, EventMonth
+
+COUNTS_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_events(start, end):
+    """
+    Imported events overlapping the range from ``start`` to ``end``
+    (inclusive), by start date. Only the first ``EventMonth.MAX_MONTHS``
+    months of an event are indexed.
+    """
+    months = EventMonth.objects.filter(month__gte=start.replace(day=1), month__lte=end)
+    return Event.objects.filter(
+        pk__in=months.values('event_id'), name__isnull=False, start_date__lte=end,
+    ).filter(
+        Q(end_date__gte=start) | Q(end_date__isnull=True, start_date__gte=start)
+    ).order_by('start_date', 'pk')
+
+
+def get_cfps(start, end, tz):
+    """
+    Imported events whose CfP deadline falls within the range from
+    ``start`` to ``end`` (inclusive) in the timezone ``tz``, by deadline.
+    """
+    begin = tz.localize(datetime.combine(start, time.min))
+    finish = tz.localize(datetime.combine(end + timedelta(days=1), time.min))
+    return Event.objects.filter(
+        name__isnull=False, cfp_deadline__gte=begin, cfp_deadline__lt=finish
+    ).order_by('cfp_deadline', 'pk')
+
+
+def get_month_counts(first, last):
+    """
+    Returns a dict of month (its first day) to number of events, for the
+    months from ``first`` to ``last``. Counted from the EventMonth index,
+    and cached for the current catalogue version.
+    """
+    first, last = first.replace(day=1), last.replace(day=1)
+    key = 'calendar:counts:{}:{}:{}'.format(feeds.get_version(), first.isoformat(), last.isoformat())
+    counts = cache.get(key)
+    if counts is None:
+        counts = dict(
+            EventMonth.objects.filter(month__gte=first, month__lte=last)
+            .values_list('month').annotate(count=Count('id')).order_by('month')
+        )
+        cache.set(key, counts, COUNTS_CACHE_TIMEOUT)
+    return counts
+
+
+def add_months(day, months):
+    """
+    The first day of the month ``months`` months after that of ``day``,
+    limited to the months of ``date.min`` and ``date.max``.
+    """
+    index = day.year * 12 + day.month - 1 + months
+    index = min(max(index, date.min.year * 12), date.max.year * 12 + 11)
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
@@ -0,0 +1,119 @@
+"""
+The HTTP client used to fetch event data.
+
+All fetches share one pooled session, so that connections (and TLS sessions)
+to the same host are kept alive and reused. Every request has connect/read
+timeouts and an overall deadline, and bodies are streamed and aborted once
+they grow beyond ``WHEN_FETCH_MAX_SIZE``. Hosts that are down are not
+contacted for a while, see ``when.events.hosts``.
+"""
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from when.events import hosts, metrics
+
+try:
+    import brotli  # NOQA
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+CHUNK_SIZE = 16 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class ResponseTooLarge(requests.RequestException):
+    pass
+
+
+class HostUnavailable(requests.RequestException):
+    pass
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.WHEN_FETCH_POOL_SIZE,
+                    pool_maxsize=settings.WHEN_FETCH_POOL_SIZE,
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({
+                    'Accept': 'application/json',
+                    'Accept-Encoding': ACCEPT_ENCODING,
+                    'User-Agent': 'when.events',
+                })
+                _session = session
+    return _session
+
+
+def get(url, headers=None):
+    """
+    Returns a fully read ``requests.Response``. Raises ``ResponseTooLarge``
+    if the body exceeds the size limit, ``requests.Timeout`` if the
+    response takes longer than the deadline, even if data keeps trickling
+    in, and ``HostUnavailable`` if the host's circuit is open. Requests are
+    rate-limited per host, see ``when.events.hosts``.
+    """
+    host = hosts.get_host(url)
+    if not host.breaker.allow():
+        metrics.FETCH_CIRCUIT_REJECTIONS.inc()
+        raise HostUnavailable('{} is unavailable, not retrying for {:.0f} seconds.'.format(
+            host.name, host.breaker.retry_after()
+        ))
+    delay = host.bucket.reserve()
+    if delay:
+        metrics.FETCH_STAGE_SECONDS.observe(delay, stage='rate_limit')
+        time.sleep(delay)
+    try:
+        with metrics.FETCH_STAGE_SECONDS.time(stage='download'):
+            response = _get(url, headers)
+    except (requests.ConnectionError, requests.Timeout):
+        host.breaker.failure()
+        raise
+    except Exception:
+        # The host did answer, e.g. with a response that is too large.
+        host.breaker.success()
+        raise
+    if response.status_code >= 500:
+        host.breaker.failure()
+    else:
+        host.breaker.success()
+    # The time until the response headers were parsed: DNS, connect, TLS
+    # and the remote server's processing.
+    metrics.FETCH_STAGE_SECONDS.observe(response.elapsed.total_seconds(), stage='headers')
+    metrics.FETCH_BODY_BYTES.observe(len(response.content))
+    return response
+
+
+def _get(url, headers=None):
+    max_size = settings.WHEN_FETCH_MAX_SIZE
+    deadline = time.monotonic() + settings.WHEN_FETCH_DEADLINE
+    response = get_session().get(
+        url, headers=headers, timeout=settings.WHEN_FETCH_TIMEOUT, stream=True
+    )
+    try:
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_size:
+            raise ResponseTooLarge('Response is larger than {} bytes.'.format(max_size))
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            body += chunk
+            if len(body) > max_size:
+                raise ResponseTooLarge('Response is larger than {} bytes.'.format(max_size))
+            if time.monotonic() > deadline:
+                raise requests.Timeout('Response took longer than {} seconds.'.format(settings.WHEN_FETCH_DEADLINE))
+        response._content = bytes(body)
+    finally:
+        response.close()
+    return response
@@ -0,0 +1,199 @@
+"""
+iCalendar and JSON feeds of all imported events, and the change feed.
+
+Feeds are rendered at most once per catalogue version: the version is
+the time of the last change to the imported events, read from the single
+row of ``CatalogueVersion``. Rendered feeds are kept in the cache under
+that version, and the version doubles as the feed's ETag.
+
+The change feed is read from the log instead: clients pass the cursor of
+their last sync and receive only the changes since then.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils.timezone import now, utc
+
+from when.events.models import CatalogueVersion, Event, Log
+from when.events.schedule import is_change
+
+CACHE_TIMEOUT = 24 * 60 * 60
+ITERATOR_CHUNK_SIZE = 500
+SCAN_FACTOR = 10
+
+
+def get_events():
+    """All events that have been imported successfully at least once."""
+    return Event.objects.filter(name__isnull=False)
+
+
+def get_version():
+    changed = CatalogueVersion.get()
+    return str(int(changed.timestamp() * 1000000) if changed else 0)
+
+
+def get_etag(kind, version):
+    return '"{}"'.format(hashlib.sha1('{}:{}'.format(kind, version).encode()).hexdigest())
+
+
+def cached_stream(key, chunks):
+    """
+    Yields the encoded chunks, and caches the complete body once the last
+    chunk has been generated.
+    """
+    parts = []
+    for chunk in chunks:
+        chunk = chunk.encode()
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(parts), CACHE_TIMEOUT)
+
+
+def _ical_escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _ical_line(name, value, escape=True):
+    """Folds content lines longer than 75 octets, as RFC 5545 requires."""
+    line = '{}:{}'.format(name, _ical_escape(value) if escape else value)
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split inside a multi-byte character.
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ical_datetime(value):
+    return value.astimezone(utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def ical_chunks(events):
+    stamp = _ical_datetime(now())
+    yield (
+        'BEGIN:VCALENDAR\r\n'
+        'VERSION:2.0\r\n'
+        'PRODID:-//when.events//when.events//EN\r\n'
+        'CALSCALE:GREGORIAN\r\n'
+        'X-WR-CALNAME:when.events\r\n'
+    )
+    for event in events.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        url = (event.urls or {}).get('home') or event.data_url
+        dtstamp = _ical_datetime(event.last_changed) if event.last_changed else stamp
+        if event.start_date:
+            # Event dates are all-day dates, and as such already local to
+            # the event's timezone. DTEND is exclusive.
+            end_date = (event.end_date or event.start_date) + timedelta(days=1)
+            lines = [
+                'BEGIN:VEVENT\r\n',
+                _ical_line('UID', 'event-{}@when.events'.format(event.pk)),
+                _ical_line('DTSTAMP', dtstamp, escape=False),
+                _ical_line('DTSTART;VALUE=DATE', event.start_date.strftime('%Y%m%d'), escape=False),
+                _ical_line('DTEND;VALUE=DATE', end_date.strftime('%Y%m%d'), escape=False),
+                _ical_line('SUMMARY', event.name),
+                _ical_line('URL', url, escape=False),
+            ]
+            if event.location:
+                lines.append(_ical_line('LOCATION', event.location))
+            if event.description:
+                lines.append(_ical_line('DESCRIPTION', event.description))
+            lines.append('END:VEVENT\r\n')
+            yield ''.join(lines)
+        if event.cfp_deadline:
+            yield ''.join([
+                'BEGIN:VEVENT\r\n',
+                _ical_line('UID', 'cfp-{}@when.events'.format(event.pk)),
+                _ical_line('DTSTAMP', dtstamp, escape=False),
+                _ical_line('DTSTART', _ical_datetime(event.cfp_deadline), escape=False),
+                _ical_line('DTEND', _ical_datetime(event.cfp_deadline), escape=False),
+                _ical_line('SUMMARY', 'CfP deadline: {}'.format(event.name)),
+                _ical_line('DESCRIPTION', 'CfP deadline ({})'.format(event.cfp_deadline.astimezone(
+                    event.get_timezone()).strftime('%Y-%m-%d %H:%M %Z'))),
+                _ical_line('URL', (event.urls or {}).get('cfp') or url, escape=False),
+                'END:VEVENT\r\n',
+            ])
+    yield 'END:VCALENDAR\r\n'
+
+
+def json_chunks(events):
+    """Renders a JSON Feed, see https://jsonfeed.org/version/1"""
+    yield '{"version": "https://jsonfeed.org/version/1", "title": "when.events", '
+    yield '"home_page_url": "https://when.events", "items": ['
+    separator = ''
+    for event in events.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        item = {
+            'id': event.data_url,
+            'url': (event.urls or {}).get('home') or event.data_url,
+            'title': event.name,
+            'content_text': event.description or '',
+            'tags': [tag for tag in event.tag_list if tag],
+            '_when_events': {
+                'shortName': event.short_name,
+                'startDate': event.start_date.isoformat() if event.start_date else None,
+                'endDate': event.end_date.isoformat() if event.end_date else None,
+                'cfpDeadline': event.cfp_deadline.isoformat() if event.cfp_deadline else None,
+                'timezone': event.timezone,
+                'location': event.location,
+            },
+        }
+        if event.last_changed:
+            item['date_modified'] = event.last_changed.isoformat()
+        yield separator + json.dumps(item)
+        separator = ', '
+    yield ']}'
+
+
+def get_changes(since_id=0, since_timestamp=None, limit=100):
+    """
+    Returns ``(changes, cursor, more)``: the create/update log entries after
+    the given log id (or timestamp), oldest first, at most ``limit`` of them.
+    Unchanged polls and failures are skipped. ``cursor`` is the log id to
+    continue from (also when starting from a timestamp), and ``more`` tells
+    whether there may be further changes. To keep the work per request
+    bounded, at most ``limit * SCAN_FACTOR`` log entries are examined.
+    """
+    logs = Log.objects.filter(state='ok').select_related('event').order_by('id')
+    cursor = since_id or 0
+    if since_timestamp is not None:
+        logs = logs.filter(timestamp__gt=since_timestamp)
+        # If nothing follows, clients continue from the last entry up to
+        # that time, instead of from the very beginning.
+        cursor = Log.objects.filter(timestamp__lte=since_timestamp).order_by(
+            '-timestamp', '-id'
+        ).values_list('id', flat=True).first() or 0
+    if since_id:
+        logs = logs.filter(id__gt=since_id)
+    scan = limit * SCAN_FACTOR
+    changes = []
+    scanned = 0
+    for log in logs[:scan].iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        scanned += 1
+        cursor = log.id
+        if is_change(log.state, log.content):
+            changes.append(log)
+            if len(changes) >= limit:
+                break
+    return changes, cursor, len(changes) >= limit or scanned >= scan
+
+
+def serialize_change(log):
+    return {
+        'id': log.id,
+        'event': log.event.short_name,
+        'dataUrl': log.event.data_url,
+        'action': log.content['action'],
+        'fields': log.content.get('fields', []),
+        'timestamp': log.timestamp.isoformat(),
+    }
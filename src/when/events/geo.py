@@ -0,0 +1,41 @@
+"""
+Distances and bounding boxes on the earth's surface.
+
+Event coordinates are stored as plain latitude/longitude columns with a
+composite index, so radius searches first narrow the candidates down to a
+bounding box via the index, and then compare an equirectangular distance
+computed in SQL. At the radii people search for events in, this is within
+a fraction of a percent of the great-circle distance.
+"""
+import math
+
+EARTH_RADIUS = 6371.0088  # km
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS / 360
+
+
+def normalize_longitude(longitude):
+    return (longitude + 180) % 360 - 180
+
+
+def bounding_box(latitude, longitude, radius):
+    """
+    Returns ``(south, west, north, east)`` of the box containing all points
+    within ``radius`` km. If the box crosses the antimeridian, west is
+    greater than east.
+    """
+    delta = radius / KM_PER_DEGREE
+    south, north = latitude - delta, latitude + delta
+    scale = math.cos(math.radians(latitude))
+    if south <= -90 or north >= 90 or scale * 180 <= delta:
+        return max(south, -90), -180, min(north, 90), 180
+    return south, normalize_longitude(longitude - delta / scale), north, normalize_longitude(longitude + delta / scale)
+
+
+def distance(latitude, longitude, other_latitude, other_longitude):
+    """The great-circle distance between two points in km."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    a = (
+        math.sin((other_phi - phi) / 2) ** 2
+        + math.cos(phi) * math.cos(other_phi) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
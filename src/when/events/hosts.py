@@ -0,0 +1,115 @@
+"""
+Per-host politeness and failure handling for fetches.
+
+Every remote host gets a token bucket, which limits how many requests per
+second are sent to it (``WHEN_FETCH_HOST_RATE``, with bursts of up to
+``WHEN_FETCH_HOST_BURST``), and a circuit breaker: after
+``WHEN_FETCH_BREAKER_THRESHOLD`` consecutive connection failures, timeouts
+or server errors, the circuit opens and requests to the host fail at once,
+without a network attempt. After ``WHEN_FETCH_BREAKER_COOLDOWN`` seconds,
+a single probe request is let through; if it succeeds, the circuit closes
+again, otherwise it stays open for another cooldown.
+
+The state is kept per process.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def get_host_name(url):
+    return urlsplit(url).netloc.lower()
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns the number of seconds to wait before it
+        may be used. Waiting callers are served in the order they reserved.
+        """
+        with self.lock:
+            current = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (current - self.updated) * self.rate)
+            self.updated = current
+            self.tokens -= 1
+            return max(0, -self.tokens / self.rate)
+
+
+class CircuitBreaker:
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a request may be sent. While the circuit is open, this is
+        true only once per cooldown, for the probe request.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            return False
+
+    def retry_after(self):
+        """Seconds until the next probe request will be let through."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            return max(0, self.opened_at + self.cooldown - time.monotonic())
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class Host:
+
+    def __init__(self, name):
+        self.name = name
+        self.bucket = TokenBucket(settings.WHEN_FETCH_HOST_RATE, settings.WHEN_FETCH_HOST_BURST)
+        self.breaker = CircuitBreaker(settings.WHEN_FETCH_BREAKER_THRESHOLD, settings.WHEN_FETCH_BREAKER_COOLDOWN)
+
+
+def get_host(url):
+    name = get_host_name(url)
+    host = _hosts.get(name)
+    if host is None:
+        with _hosts_lock:
+            host = _hosts.setdefault(name, Host(name))
+    return host
+
+
+def reset():
+    """Forgets the state of all hosts."""
+    with _hosts_lock:
+        _hosts.clear()
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from when.events.retention import DEFAULT_CHUNK_SIZE, compact_logs
+
+
+class Command(BaseCommand):
+    help = 'Collapses repeated log entries, truncates large ones and deletes old ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int,
+            help='Delete log entries older than this many days. Defaults to WHEN_LOG_MAX_AGE.',
+        )
+        parser.add_argument(
+            '--keep', type=int,
+            help='Number of latest entries per event to keep regardless of age. Defaults to WHEN_LOG_KEEP.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Number of events to compact per transaction.',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to wait between chunks, to run in the background alongside other writers.',
+        )
+
+    def handle(self, *args, **options):
+        stats = compact_logs(
+            max_age=options['max_age'],
+            keep=options['keep'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+        )
+        self.stdout.write(
+            'Collapsed {collapsed}, truncated {shrunk} and deleted {pruned} log entries.'.format(
+                collapsed=stats['collapsed'], shrunk=stats['shrunk'], pruned=stats['pruned'],
+            )
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from when.events import queue
+from when.events.models import FetchMetrics
+from when.events.refresh import DEFAULT_PER_HOST, DEFAULT_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Fetches the events that were submitted on the start page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Process the currently queued events and exit, instead of running forever.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=queue.DEFAULT_INTERVAL,
+            help='Seconds to wait before looking for new jobs when the queue is empty.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=queue.DEFAULT_LIMIT,
+            help='Number of jobs to claim at once.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=DEFAULT_WORKERS,
+            help='Number of concurrent downloads.',
+        )
+        parser.add_argument(
+            '--per-host', type=int, default=DEFAULT_PER_HOST,
+            help='Maximum number of concurrent downloads per host.',
+        )
+
+    def handle(self, *args, **options):
+        kwargs = {'limit': options['limit'], 'workers': options['workers'], 'per_host': options['per_host']}
+        if not options['once']:
+            queue.run(interval=options['interval'], **kwargs)
+        processed = 0
+        try:
+            while True:
+                results = queue.process(**kwargs)
+                if not results:
+                    break
+                processed += len(results)
+                if options['verbosity'] > 1:
+                    for event, log in results:
+                        self.stdout.write('{}: {}'.format(event.data_url, log.state))
+        finally:
+            FetchMetrics.export()
+        self.stdout.write('Processed {} queued events.'.format(processed))
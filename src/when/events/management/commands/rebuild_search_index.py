@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from when.events import search
+from when.events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of all events.'
+
+    def handle(self, *args, **options):
+        count = search.rebuild(Event.objects.all())
+        self.stdout.write('Indexed {} events.'.format(count))
@@ -0,0 +1,67 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from when.events.models import Event, FetchMetrics
+from when.events.refresh import (
+    DEFAULT_BATCH_SIZE, DEFAULT_PER_HOST, DEFAULT_WORKERS, refresh_events,
+)
+
+
+class Command(BaseCommand):
+    help = 'Fetches the data of all events from their data URLs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=DEFAULT_WORKERS,
+            help='Number of concurrent downloads.',
+        )
+        parser.add_argument(
+            '--per-host', type=int, default=DEFAULT_PER_HOST,
+            help='Maximum number of concurrent downloads per host.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Number of events to write per transaction. Use 0 to write every event on its own.',
+        )
+        parser.add_argument(
+            '--due', action='store_true',
+            help='Only refresh events that are due according to their schedule, most overdue first.',
+        )
+        parser.add_argument(
+            '--limit', type=int,
+            help='Refresh at most this many events.',
+        )
+        parser.add_argument(
+            '--state', action='append', dest='states',
+            choices=['new', 'ok', 'unreachable', 'error'],
+            help='Only refresh events in this state. Can be given multiple times.',
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['states']:
+            events = events.filter(state__in=options['states'])
+        if options['due']:
+            events = events.due()
+        if options['limit']:
+            events = events[:options['limit']]
+        states = Counter()
+        try:
+            for event, log in refresh_events(
+                events,
+                workers=options['workers'],
+                per_host=options['per_host'],
+                batch_size=options['batch_size'],
+            ):
+                states[log.state] += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write('{}: {}'.format(event.data_url, log.state))
+        finally:
+            FetchMetrics.export()
+        self.stdout.write(
+            'Refreshed {} events ({}).'.format(
+                sum(states.values()),
+                ', '.join('{} {}'.format(count, state) for state, count in sorted(states.items())),
+            )
+        )
@@ -0,0 +1,84 @@
+"""
+Mapping between the camelCase keys of the event schema and the attributes
+of the Event model.
+
+The mapping plan is built once per schema version and model (and again
+after ``schema.reload()``), so that importing a document is a dictionary
+lookup and a type coercion per key.
+"""
+import re
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+
+from when import schema
+
+FieldMapping = namedtuple('FieldMapping', ('key', 'attribute', 'columns', 'coerce'))
+
+
+def decamel(name):
+    if name.lower() == name:
+        return name
+    s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
+    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+
+
+def _identity(value):
+    return value
+
+
+def _get_coercion(field):
+    if isinstance(field, models.DateTimeField):
+
+        def coerce(value):
+            value = field.to_python(value)
+            if value is not None and timezone.is_naive(value):
+                value = timezone.make_aware(value, timezone.get_default_timezone())
+            return value
+
+        return coerce
+    if isinstance(field, (
+        models.DateField, models.IntegerField, models.BooleanField, models.CharField, models.TextField
+    )):
+        return field.to_python
+    return _identity
+
+
+@schema.derived
+def get_plan(version, model):
+    """
+    Returns a dict of schema key to FieldMapping. Schema keys without a
+    model field (like ``version``) are not part of the plan.
+
+    Array properties are routed to the ``<name>_list`` property of the
+    model where one exists, e.g. ``tags`` is read and written via
+    ``Event.tag_list``, but stored in the ``tags`` column.
+
+    Properties stored in several columns are listed in the model's
+    ``COMPOSITE_FIELDS`` as ``name: (columns, coerce)``, and are read and
+    written via the model attribute of the same name.
+
+    Fields that need more than the coercion of their type list it in the
+    model's ``COERCIONS`` as ``column: coerce``.
+    """
+    plan = {}
+    composite_fields = getattr(model, 'COMPOSITE_FIELDS', {})
+    coercions = getattr(model, 'COERCIONS', {})
+    for key, definition in schema.get_schema(version)['properties'].items():
+        column = decamel(key)
+        if column in composite_fields:
+            columns, coerce = composite_fields[column]
+            plan[key] = FieldMapping(key, column, columns, coerce)
+            continue
+        try:
+            field = model._meta.get_field(column)
+        except FieldDoesNotExist:
+            continue
+        list_attribute = column[:-1] + '_list'
+        if definition.get('type') == 'array' and isinstance(getattr(model, list_attribute, None), property):
+            plan[key] = FieldMapping(key, list_attribute, (column,), list)
+        else:
+            plan[key] = FieldMapping(key, field.attname, (column,), coercions.get(column) or _get_coercion(field))
+    return plan
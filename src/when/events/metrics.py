@@ -0,0 +1,207 @@
+"""
+Metrics of the fetch pipeline, exposed in the Prometheus text format at
+``/metrics``.
+
+Recording a value costs a lock and a few additions, so the instrumentation
+stays enabled in production. Values are recorded per process. Events are
+fetched by the management commands, which add their values to a shared
+snapshot in the database (``FetchMetrics.export``) when they are done, and
+the queue worker after every round of jobs. ``/metrics`` shows that
+snapshot together with the values of its own process.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+REGISTRY = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = defaultdict(int)
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] += amount
+
+    def snapshot(self, reset=False):
+        with self.lock:
+            values = dict(self.values)
+            if reset:
+                self.values.clear()
+        return values
+
+    @staticmethod
+    def add(values, key, value):
+        values[key] = values.get(key, 0) + value
+
+    def render(self, values=None):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} counter'.format(self.name)]
+        values = self.snapshot() if values is None else values
+        for key, value in sorted(values.items()):
+            lines.append('{}{} {}'.format(self.name, _format_labels(self.labels, key), _format_value(value)))
+        return lines
+
+
+class Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        # Per label set: [count per bucket (the last one is +Inf), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [[0] * (len(self.buckets) + 1), 0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def time(self, **labels):
+        """Returns a context manager observing the time spent in it."""
+        return Timer(self, labels)
+
+    def snapshot(self, reset=False):
+        with self.lock:
+            values = {key: [list(counts), total] for key, (counts, total) in self.values.items()}
+            if reset:
+                self.values.clear()
+        return values
+
+    @staticmethod
+    def add(values, key, value):
+        counts, total = value
+        current = values.get(key)
+        if current is None:
+            values[key] = [list(counts), total]
+        elif len(current[0]) == len(counts):
+            current[0] = [a + b for a, b in zip(current[0], counts)]
+            current[1] += total
+
+    def render(self, values=None):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} histogram'.format(self.name)]
+        values = self.snapshot() if values is None else values
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _format_labels(self.labels, key, [('le', _format_value(float(bound)))]), cumulative
+                ))
+            lines.append('{}_sum{} {}'.format(self.name, _format_labels(self.labels, key), _format_value(float(total))))
+            lines.append('{}_count{} {}'.format(self.name, _format_labels(self.labels, key), cumulative))
+        return lines
+
+
+def take():
+    """
+    Returns the values recorded in this process since the last call, as
+    ``{name: [[label values, value], ...]}``, and resets them.
+    """
+    return {
+        metric.name: [[list(key), value] for key, value in sorted(metric.snapshot(reset=True).items())]
+        for metric in REGISTRY
+    }
+
+
+def merge(*exports):
+    """Adds up values as returned by ``take``."""
+    result = {}
+    for metric in REGISTRY:
+        values = {}
+        for export in exports:
+            for key, value in export.get(metric.name, []):
+                metric.add(values, tuple(key), value)
+        result[metric.name] = [[list(key), value] for key, value in sorted(values.items())]
+    return result
+
+
+def restore(export):
+    """Adds values as returned by ``take`` back to those of this process."""
+    for metric in REGISTRY:
+        with metric.lock:
+            for key, value in export.get(metric.name, []):
+                metric.add(metric.values, tuple(key), value)
+
+
+def render(exported=None):
+    """
+    Renders the values of this process, plus the ``exported`` values of
+    other processes (as returned by ``take``).
+    """
+    lines = []
+    for metric in REGISTRY:
+        values = metric.snapshot()
+        for key, value in (exported or {}).get(metric.name, []):
+            metric.add(values, tuple(key), value)
+        lines += metric.render(values)
+    return '\n'.join(lines) + '\n'
+
+
+FETCH_STAGE_SECONDS = Histogram(
+    'when_fetch_stage_seconds',
+    'Time spent in each stage of fetching an event.',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    labels=('stage',),
+)
+FETCH_BODY_BYTES = Histogram(
+    'when_fetch_body_bytes',
+    'Size of the downloaded event documents.',
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576),
+)
+FETCH_RESULTS = Counter(
+    'when_fetch_results_total',
+    'Results of fetching events, by the resulting state.',
+    labels=('state',),
+)
+FETCH_CIRCUIT_REJECTIONS = Counter(
+    'when_fetch_circuit_rejections_total',
+    'Fetches that were not attempted because the circuit of their host was open.',
+)
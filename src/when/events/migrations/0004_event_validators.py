@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_auto_20190330_2315'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='content_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='etag',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='last_modified',
+            field=models.CharField(max_length=50, null=True),
+        ),
+    ]
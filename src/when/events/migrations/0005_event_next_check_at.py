@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='next_check_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_next_check_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['state', 'cfp_deadline'], name='event_state_cfp_deadline'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_date'], name='event_start_date'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['needs_review'], name='event_needs_review'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['timestamp'], name='log_timestamp'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['event', 'timestamp'], name='log_event_timestamp'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='first_timestamp',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_log_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='last_changed',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_last_changed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requested_at', models.DateTimeField(db_index=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('requeue', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fetchjob',
+            name='event',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fetch_job', to='events.Event'),
+        ),
+    ]
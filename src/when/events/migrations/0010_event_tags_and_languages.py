@@ -0,0 +1,77 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:09
+
+import ast
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def parse_list(value):
+    # Languages were stored as str() of the list from the schema, e.g.
+    # "['en', 'de']", because the language_list property was misspelt.
+    value = (value or '').strip()
+    if value.startswith('['):
+        try:
+            items = ast.literal_eval(value)
+        except (SyntaxError, ValueError):
+            items = []
+        return [str(item).strip() for item in items if isinstance(item, str) and item.strip()]
+    return [part for part in value.strip(',').split(',') if part]
+
+
+def fill_keywords(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    EventTag = apps.get_model('events', 'EventTag')
+    EventLanguage = apps.get_model('events', 'EventLanguage')
+    tags, languages = [], []
+    for event_id, event_tags, event_languages in Event.objects.values_list('id', 'tags', 'languages').iterator():
+        codes = parse_list(event_languages)
+        if (event_languages or '').strip().startswith('['):
+            Event.objects.filter(pk=event_id).update(languages=',' + ','.join(codes) + ',' if codes else None)
+        tags += [EventTag(event_id=event_id, name=name) for name in {name[:200] for name in parse_list(event_tags)}]
+        languages += [EventLanguage(event_id=event_id, code=code) for code in {code[:20] for code in codes}]
+    EventTag.objects.bulk_create(tags, batch_size=500)
+    EventLanguage.objects.bulk_create(languages, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_fetchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventLanguage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='eventtag',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_tags', to='events.Event'),
+        ),
+        migrations.AddField(
+            model_name='eventlanguage',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_languages', to='events.Event'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventtag',
+            unique_together={('name', 'event')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventlanguage',
+            unique_together={('code', 'event')},
+        ),
+        migrations.RunPython(fill_keywords, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:14
+
+import re
+
+from django.db import migrations, models
+
+
+def parse_coordinates(value):
+    # The column contains str() of the ["lat", "lon"] list from the schema.
+    numbers = re.findall(r'-?\d+(?:\.\d+)?', value or '')
+    if len(numbers) != 2:
+        return None, None
+    latitude, longitude = (float(number) for number in numbers)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None
+    return latitude, longitude
+
+
+def split_coordinates(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    for event in Event.objects.exclude(coordinates__isnull=True).only('coordinates').iterator():
+        latitude, longitude = parse_coordinates(event.coordinates)
+        if latitude is not None:
+            Event.objects.filter(pk=event.pk).update(latitude=latitude, longitude=longitude)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_event_tags_and_languages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='latitude',
+            field=models.FloatField(null=True, verbose_name='Latitude'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='longitude',
+            field=models.FloatField(null=True, verbose_name='Longitude'),
+        ),
+        migrations.RunPython(split_coordinates, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='event',
+            name='coordinates',
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['latitude', 'longitude'], name='event_coordinates'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# The index as of this migration. Later changes to when.events.search need
+# migrations of their own.
+FIELDS = ('name', 'short_name', 'organizer', 'location', 'description', 'tags')
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE events_event_fts USING fts5(name, short_name, organizer, location, description, tags, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    ],
+    'postgresql': [
+        'CREATE TABLE events_event_search (event_id integer PRIMARY KEY REFERENCES events_event (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)',
+        'CREATE INDEX events_event_search_document ON events_event_search USING gin (document)',
+    ],
+}
+INSERT_SQL = {
+    'sqlite': (
+        'INSERT OR REPLACE INTO events_event_fts (rowid, name, short_name, organizer, location, description, tags) '
+        'VALUES (%s, %s, %s, %s, %s, %s, %s)'
+    ),
+    'postgresql': (
+        "INSERT INTO events_event_search (event_id, document) VALUES (%s, "
+        "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'C') || "
+        "setweight(to_tsvector('simple', %s), 'D') || setweight(to_tsvector('simple', %s), 'B'))"
+    ),
+}
+DROP_SQL = {
+    'sqlite': ['DROP TABLE IF EXISTS events_event_fts'],
+    'postgresql': ['DROP TABLE IF EXISTS events_event_search'],
+}
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_SQL:
+        return
+    for statement in CREATE_SQL[connection.vendor]:
+        schema_editor.execute(statement)
+    Event = apps.get_model('events', 'Event')
+    rows = []
+    for values in Event.objects.using(connection.alias).values_list('pk', *FIELDS).iterator():
+        row = [value or '' for value in values]
+        row[0] = values[0]
+        row[-1] = row[-1].replace(',', ' ').strip()
+        rows.append(row)
+    with connection.cursor() as cursor:
+        cursor.executemany(INSERT_SQL[connection.vendor], rows)
+
+
+def drop_index(apps, schema_editor):
+    for statement in DROP_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_event_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:13
+
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def get_months(start_date, end_date, max_months=36):
+    if not start_date:
+        return []
+    month = start_date.replace(day=1)
+    last = max(end_date or start_date, start_date).replace(day=1)
+    months = []
+    while month <= last and len(months) < max_months:
+        months.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def fill_months(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    EventMonth = apps.get_model('events', 'EventMonth')
+    months = []
+    for event_id, start_date, end_date in Event.objects.values_list('id', 'start_date', 'end_date').iterator():
+        months += [
+            EventMonth(event_id=event_id, month=month)
+            for month in get_months(start_date, end_date)
+        ]
+    EventMonth.objects.bulk_create(months, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='eventmonth',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='months', to='events.Event'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventmonth',
+            unique_together={('month', 'event')},
+        ),
+        migrations.RunPython(fill_months, migrations.RunPython.noop),
+    ]
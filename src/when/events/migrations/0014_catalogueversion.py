@@ -0,0 +1,28 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:35
+
+from django.db import migrations, models
+from django.utils.timezone import now
+
+
+def create_version(apps, schema_editor):
+    apps.get_model('events', 'CatalogueVersion').objects.using(schema_editor.connection.alias).create(
+        pk=1, changed=now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0013_eventmonth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.1.7 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0014_catalogueversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['cfp_deadline'], name='event_cfp_deadline'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.1.7 on 2026-10-18 16:55
+
+import jsonfallback.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0015_event_cfp_deadline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', jsonfallback.fields.FallbackJSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.1.7 on 2026-10-18 17:20
+
+import re
+
+from django.db import migrations
+
+WEB_URL = re.compile(r'https?://', re.IGNORECASE)
+
+
+def drop_unsafe_urls(apps, schema_editor):
+    # Imported documents could set e.g. javascript: links, which were
+    # rendered as they were.
+    Event = apps.get_model('events', 'Event')
+    for event in Event.objects.exclude(urls__isnull=True).only('urls').iterator():
+        if not isinstance(event.urls, dict):
+            continue
+        urls = {key: url for key, url in event.urls.items() if isinstance(url, str) and WEB_URL.match(url)}
+        if urls != event.urls:
+            Event.objects.filter(pk=event.pk).update(urls=urls)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0016_fetchmetrics'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_unsafe_urls, migrations.RunPython.noop),
+    ]
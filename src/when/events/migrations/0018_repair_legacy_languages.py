@@ -0,0 +1,32 @@
+# Generated by Django 2.1.7 on 2026-10-18 17:40
+
+import ast
+
+from django.db import migrations
+
+
+def repair_languages(apps, schema_editor):
+    # Databases that ran 0010 before it parsed the legacy "['en', 'de']"
+    # values got languages codes like "['en'".
+    Event = apps.get_model('events', 'Event')
+    EventLanguage = apps.get_model('events', 'EventLanguage')
+    for event_id, value in Event.objects.filter(languages__startswith='[').values_list('id', 'languages').iterator():
+        try:
+            items = ast.literal_eval(value)
+        except (SyntaxError, ValueError):
+            items = []
+        codes = list(dict.fromkeys(item.strip()[:20] for item in items if isinstance(item, str) and item.strip()))
+        Event.objects.filter(pk=event_id).update(languages=',' + ','.join(codes) + ',' if codes else None)
+        EventLanguage.objects.filter(event_id=event_id).delete()
+        EventLanguage.objects.bulk_create([EventLanguage(event_id=event_id, code=code) for code in codes])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0017_event_web_urls'),
+    ]
+
+    operations = [
+        migrations.RunPython(repair_languages, migrations.RunPython.noop),
+    ]
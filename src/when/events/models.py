@@ -1,25 +1,109 @@
+import hashlib
+import math
 import re
-from functools import partial
+from collections import defaultdict
+from datetime import timedelta
 
-import jsonschema
 import pytz
 import requests
+from django.conf import settings
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin,
 )
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, models, transaction
+from django.db.models import Case, ExpressionWrapper, F, Q, When
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 from jsonfallback.fields import FallbackJSONField
 
 from when import schema
+from when.events import client, geo, metrics, schedule, search
+from when.events.mapping import get_plan
+
+
+class EventQuerySet(models.QuerySet):
+    def due(self, when=None):
+        """
+        Events that should be fetched now, the most overdue ones first.
+        Events that have never been scheduled are due immediately.
+        """
+        when = when or now()
+        return self.filter(
+            Q(next_check_at__lte=when) | Q(next_check_at__isnull=True)
+        ).order_by(F('next_check_at').asc(nulls_first=True))
+
+    def within_box(self, south, west, north, east):
+        """
+        Events inside the given box. If west is greater than east, the box
+        crosses the antimeridian.
+        """
+        events = self.filter(latitude__gte=south, latitude__lte=north)
+        if west <= east:
+            return events.filter(longitude__gte=west, longitude__lte=east)
+        return events.filter(Q(longitude__gte=west) | Q(longitude__lte=east))
+
+    def by_distance(self, latitude, longitude):
+        """
+        Orders the events by their distance to the given point, nearest
+        first, and annotates them with ``distance_sq``, the squared
+        equirectangular distance in degrees.
+        """
+        scale = math.cos(math.radians(latitude))
+        delta_longitude = Case(
+            When(longitude__gt=longitude + 180, then=F('longitude') - (longitude + 360)),
+            When(longitude__lt=longitude - 180, then=F('longitude') - (longitude - 360)),
+            default=F('longitude') - longitude,
+            output_field=models.FloatField(),
+        )
+        delta_latitude = F('latitude') - latitude
+        distance_sq = ExpressionWrapper(
+            delta_latitude * delta_latitude + delta_longitude * delta_longitude * (scale * scale),
+            output_field=models.FloatField(),
+        )
+        return self.filter(latitude__isnull=False, longitude__isnull=False).annotate(
+            distance_sq=distance_sq
+        ).order_by('distance_sq', 'pk')
+
+    def near(self, latitude, longitude, radius):
+        """Events within ``radius`` km, nearest first, see ``by_distance``."""
+        return self.within_box(*geo.bounding_box(latitude, longitude, radius)).by_distance(
+            latitude, longitude
+        ).filter(distance_sq__lte=(radius / geo.KM_PER_DEGREE) ** 2)
+
+    def tagged(self, tag):
+        return self.filter(event_tags__name=tag)
+
+    def in_language(self, code):
+        return self.filter(event_languages__code=code)
+
+
+def _coerce_coordinates(value):
+    try:
+        latitude, longitude = (float(part) for part in value)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return [latitude, longitude]
+
 
+WEB_URL = re.compile(r'https?://', re.IGNORECASE)
 
-def decamel(name):
-    if name.lower() == name:
-        return name
-    s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
-    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+
+def _coerce_urls(value):
+    """
+    Drops the URLs that are not http(s), e.g. ``javascript:`` links, which
+    the ``iri`` format of the schema accepts.
+    """
+    if not value:
+        return value
+    if not isinstance(value, dict):
+        raise ValidationError(_('The URLs must be an object.'))
+    return {key: url for key, url in value.items() if isinstance(url, str) and WEB_URL.match(url)}
 
 
 class Event(models.Model):
@@ -52,14 +136,14 @@ class Event(models.Model):
     )
     languages = models.CharField(
         max_length=200, null=True, verbose_name=_("Languages")
-    )  # Format: ,en,de,. Use 'language_list' property for access.
+    )  # Format: ,en,de,. Use 'language_list' property for access, and
+    # Event.objects.in_language() to filter.
     maximum_attendee_capacity = models.PositiveIntegerField(
         null=True, verbose_name=_("Maximum attendee capacity")
     )
     location = models.CharField(max_length=200, null=True, verbose_name=_("Location"))
-    coordinates = models.CharField(
-        max_length=50, null=True, verbose_name=_("Coordinates")
-    )
+    latitude = models.FloatField(null=True, verbose_name=_("Latitude"))
+    longitude = models.FloatField(null=True, verbose_name=_("Longitude"))
     description = models.TextField(null=True, verbose_name=_("Description"))
     color = models.CharField(max_length=6, null=True, verbose_name=_("Color"))
 
@@ -71,7 +155,8 @@ class Event(models.Model):
 
     tags = models.TextField(
         null=True
-    )  # Contains topics, locations, …. Use tag_list to access it.
+    )  # Contains topics, locations, …. Use tag_list to access it, and
+    # Event.objects.tagged() to filter.
 
     # INTERNAL FIELDS #
     data_url = models.URLField()
@@ -87,10 +172,52 @@ class Event(models.Model):
     )
     needs_review = models.BooleanField(default=True)
     was_reviewed = models.BooleanField(default=False)
+    # Validators of the last successfully imported document, used to
+    # skip unchanged documents on the next fetch.
+    etag = models.CharField(max_length=200, null=True)
+    last_modified = models.CharField(max_length=50, null=True)
+    content_hash = models.CharField(max_length=64, null=True)
+    next_check_at = models.DateTimeField(null=True, db_index=True)
+    # When the event data last changed, as opposed to when it was last fetched.
+    last_changed = models.DateTimeField(null=True, db_index=True)
+
+    objects = EventQuerySet.as_manager()
+
+    COMPOSITE_FIELDS = {
+        'coordinates': (('latitude', 'longitude'), _coerce_coordinates),
+    }
+    COERCIONS = {
+        'urls': _coerce_urls,
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'cfp_deadline'], name='event_state_cfp_deadline'),
+            models.Index(fields=['cfp_deadline'], name='event_cfp_deadline'),
+            models.Index(fields=['start_date'], name='event_start_date'),
+            models.Index(fields=['needs_review'], name='event_needs_review'),
+            models.Index(fields=['latitude', 'longitude'], name='event_coordinates'),
+        ]
+
+    def get_timezone(self):
+        try:
+            return pytz.timezone(self.timezone or 'UTC')
+        except pytz.UnknownTimeZoneError:
+            return pytz.utc
+
+    @property
+    def coordinates(self):
+        if self.latitude is None or self.longitude is None:
+            return None
+        return [self.latitude, self.longitude]
+
+    @coordinates.setter
+    def coordinates(self, value):
+        self.latitude, self.longitude = value or (None, None)
 
     @property
     def language_list(self):
-        return (self.lanugages or "").strip(",").split(",")
+        return (self.languages or "").strip(",").split(",")
 
     @language_list.setter
     def language_list(self, value):
@@ -104,56 +231,188 @@ class Event(models.Model):
     def tag_list(self, value):
         self.tags = "," + ",".join(value) + ","
 
-    def _update(self, data):
+    def _update(self, data, internal=None, batch=None):
+        """
+        Applies the imported data. Only changed columns are written, and
+        nothing at all if neither the data nor the internal fields changed.
+        """
         creating = self.state == 'new'
         field_list = []
+        update_fields = set()
+        plan = get_plan(data.get('version'), type(self))
+        # Coerce all values before changing anything: the schema does not
+        # enforce every format, e.g. an invalid date-time may pass it.
+        values = []
         for field, value in data.items():
-            if field == 'version':
+            mapping = plan.get(field)
+            if mapping is None:
                 continue
-            local_name = decamel(field)
-            if hasattr(self, local_name[:-1] + '_list'):
-                local_name = local_name[:-1] + '_list'
-            if not getattr(self, local_name) == value:
-                setattr(self, local_name, value)
+            try:
+                values.append((field, mapping, mapping.coerce(value)))
+            except (ValidationError, TypeError, ValueError) as e:
+                return self._fail({
+                    'path': [field],
+                    'message': ' '.join(e.messages) if isinstance(e, ValidationError) else str(e),
+                }, batch=batch)
+        for field, mapping, value in values:
+            if not getattr(self, mapping.attribute) == value:
+                setattr(self, mapping.attribute, value)
                 field_list.append(field)
-        self.state = "ok"
-        self.save()
+                update_fields.update(mapping.columns)
+        for attname, value in (internal or {}).items():
+            if not getattr(self, attname) == value:
+                setattr(self, attname, value)
+                update_fields.add(attname)
+        if self.state != "ok":
+            self.state = "ok"
+            update_fields.add('state')
+        if creating or field_list:
+            self.last_changed = now()
+            update_fields.add('last_changed')
+        if creating or not self.pk:
+            update_fields = None
         if creating:
-            content = {'action': 'create'}
+            log = self._log({'action': 'create'})
+        elif not field_list:
+            log = self._log_unchanged()
         else:
-            content = {'action': 'update', 'fields': field_list}
-        log = Log.objects.create(
+            log = self._log({'action': 'update', 'fields': field_list})
+        return self._commit(update_fields, log, batch)
+
+    def _log(self, content, state=None):
+        return Log(
             event=self if self.pk else None,
-            state=self.state,
+            state=state or self.state,
             content=content,
             timestamp=now(),
         )
-        return log
 
-    def _fail(self, error, state="error", content=None):
-        log = Log.objects.create(
-            event=self if self.pk else None,
-            state=state,
-            content={'content': content, 'error': error},
-            timestamp=now(),
-        )
-        self.state = state
-        self.save()
+    def _log_unchanged(self):
+        """
+        Polls that did not change anything are coalesced: if the latest log
+        entry of this event is an unchanged poll, too, we only count it as
+        repeated instead of adding another row.
+        """
+        content = {'action': 'update', 'fields': []}
+        log = self.recent_logs[0] if self.recent_logs else None
+        if log and log.state == self.state and log.content == content:
+            log.repeat()
+            return log
+        return self._log(content)
+
+    def _commit(self, update_fields, log, batch=None):
+        """
+        Writes the outcome of a fetch: the event (all columns if
+        ``update_fields`` is None, none if it is empty) and the log entry.
+        If a batch is given, the writes are deferred to ``batch.flush()``.
+        """
+        self._schedule(log)
+        self.__dict__.pop('recent_logs', None)
+        if update_fields is not None:
+            update_fields.add('next_check_at')
+        if batch is not None:
+            batch.add(self, update_fields, log)
+            return log
+        with metrics.FETCH_STAGE_SECONDS.time(stage='save'):
+            if update_fields is None:
+                self.save()
+            elif update_fields:
+                self.save(update_fields=update_fields)
+            sync_derived([(self, update_fields)])
+            if update_fields is None or 'last_changed' in update_fields:
+                CatalogueVersion.bump()
+            if log.pk:
+                log.save(update_fields=Log.REPEAT_FIELDS)
+            else:
+                log.save()
+        metrics.FETCH_RESULTS.inc(state=log.state)
         return log
 
-    def fetch(self):
-        response = requests.get(self.data_url)
-        fail = partial(self._fail, content=response.content.decode())
+    @cached_property
+    def recent_logs(self):
+        """
+        The latest log entries of this event, newest first. Cleared after
+        each fetch outcome has been committed.
+        """
+        if not self.pk:
+            return []
+        return list(self.logs.order_by('-pk')[:schedule.HISTORY_LENGTH])
+
+    def _schedule(self, log):
+        history = [(log.state, log.content, log.timestamp, log.count)] + [
+            (previous.state, previous.content, previous.timestamp, previous.count)
+            for previous in self.recent_logs
+            if not log.pk or previous.pk != log.pk
+        ]
+        current = now()
+        self.next_check_at = current + schedule.get_interval(self, history, current)
+
+    def _fail(self, error, state="error", content=None, batch=None):
+        log = self._log(Log.shrink_content({'content': content, 'error': error}), state=state)
+        update_fields = set()
+        if not self.pk:
+            update_fields = None
+        elif self.state != state:
+            update_fields.add('state')
+        self.state = state
+        return self._commit(update_fields, log, batch)
+
+    def _download(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return client.get(self.data_url, headers=headers)
+
+    def _validators(self, response):
+        result = {}
+        for attribute, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+            value = response.headers.get(header)
+            max_length = self._meta.get_field(attribute).max_length
+            result[attribute] = value if value and len(value) <= max_length else None
+        return result
+
+    def _unchanged(self, response, batch=None):
+        """
+        Called when the remote document is identical to the one we imported
+        last. Skips parsing, validation and (usually) saving the event.
+        """
+        update_fields = set()
+        for attribute, value in self._validators(response).items():
+            if value and value != getattr(self, attribute):
+                setattr(self, attribute, value)
+                update_fields.add(attribute)
+        if self.state != 'ok':
+            self.state = 'ok'
+            update_fields.add('state')
+        return self._commit(update_fields, self._log_unchanged(), batch)
+
+    def _process(self, response, batch=None):
+        if response.status_code == 304 and self.content_hash:
+            return self._unchanged(response, batch)
+
+        def fail(error, state="error"):
+            return self._fail(
+                error, state=state, content=response.content.decode(errors='replace'), batch=batch
+            )
 
         try:
             response.raise_for_status()
         except Exception:
             return fail(response.status_code, state="unreachable")
 
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if content_hash == self.content_hash:
+            return self._unchanged(response, batch)
+
         try:
-            content = response.json()
+            with metrics.FETCH_STAGE_SECONDS.time(stage='parse'):
+                content = response.json()
         except Exception as e:
             return fail(str(e))
+        if not isinstance(content, dict):
+            return fail("The document must be a JSON object.")
 
         if content.get("version") not in schema.VERSIONS:
             return fail(
@@ -161,16 +420,25 @@ class Event(models.Model):
                 + ", ".join(schema.VERSIONS)
             )
 
-        used_schema = schema.get_schema(content.get("version"))
         try:
-            jsonschema.validate(content, used_schema, format_checker=jsonschema.draft7_format_checker)
+            with metrics.FETCH_STAGE_SECONDS.time(stage='validate'):
+                schema.validate(content, content.get("version"))
         except Exception as e:
             return fail({
                 'path': [p for p in e.path],
                 'message': e.message,
             })
 
-        return self._update(content)
+        internal = self._validators(response)
+        internal['content_hash'] = content_hash
+        return self._update(content, internal, batch)
+
+    def fetch(self):
+        try:
+            response = self._download()
+        except requests.RequestException as e:
+            return self._fail(str(e), state="unreachable")
+        return self._process(response)
 
 
 class Log(models.Model):
@@ -187,6 +455,232 @@ class Log(models.Model):
     )
     timestamp = models.DateTimeField(auto_now_add=True)
     content = FallbackJSONField(null=True)
+    # Identical consecutive outcomes are collapsed into one entry: count is
+    # the number of outcomes, first_timestamp the time of the first one, and
+    # timestamp the time of the latest one.
+    count = models.PositiveIntegerField(default=1)
+    first_timestamp = models.DateTimeField(null=True)
+
+    REPEAT_FIELDS = ['timestamp', 'first_timestamp', 'count']
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='log_timestamp'),
+            models.Index(fields=['event', 'timestamp'], name='log_event_timestamp'),
+        ]
+
+    def repeat(self, timestamp=None, count=1):
+        """
+        Records that this outcome happened again. Save ``REPEAT_FIELDS``
+        afterwards.
+        """
+        self.first_timestamp = self.first_timestamp or self.timestamp
+        self.timestamp = timestamp or now()
+        self.count += count
+
+    @staticmethod
+    def shrink_content(content):
+        """
+        Failure logs contain the complete remote response. Responses longer
+        than ``WHEN_LOG_MAX_CONTENT_SIZE`` are truncated, and their length
+        and hash are kept instead.
+        """
+        if not isinstance(content, dict) or not isinstance(content.get('content'), str):
+            return content
+        max_size = settings.WHEN_LOG_MAX_CONTENT_SIZE
+        remote = content['content']
+        if len(remote) <= max_size:
+            return content
+        return dict(
+            content,
+            content=remote[:max_size],
+            content_length=len(remote),
+            content_sha256=hashlib.sha256(remote.encode(errors='replace')).hexdigest(),
+        )
+
+
+class EventTag(models.Model):
+    """One row per tag of an event, kept in sync with ``Event.tags``."""
+    event = models.ForeignKey(to=Event, on_delete=models.CASCADE, related_name='event_tags')
+    name = models.CharField(max_length=200)
+
+    class Meta:
+        unique_together = (('name', 'event'),)
+
+
+class EventLanguage(models.Model):
+    """One row per language of an event, kept in sync with ``Event.languages``."""
+    event = models.ForeignKey(to=Event, on_delete=models.CASCADE, related_name='event_languages')
+    code = models.CharField(max_length=20)
+
+    class Meta:
+        unique_together = (('code', 'event'),)
+
+
+def sync_keywords(outcomes):
+    """
+    Mirrors the tags and languages of the given ``(event, update_fields)``
+    pairs into the indexed EventTag and EventLanguage tables, for the events
+    where they were written. Uses at most three queries per table.
+    """
+    for model, attribute, column, get_values in (
+        (EventTag, 'name', 'tags', lambda event: event.tag_list),
+        (EventLanguage, 'code', 'languages', lambda event: event.language_list),
+    ):
+        max_length = model._meta.get_field(attribute).max_length
+        wanted = {
+            event.pk: {value[:max_length] for value in get_values(event) if value}
+            for event, update_fields in outcomes
+            if event.pk and (update_fields is None or column in update_fields)
+        }
+        if not wanted:
+            continue
+        existing = defaultdict(set)
+        stale = []
+        for pk, event_id, value in model.objects.filter(event_id__in=wanted).values_list('pk', 'event_id', attribute):
+            if value in wanted[event_id]:
+                existing[event_id].add(value)
+            else:
+                stale.append(pk)
+        if stale:
+            model.objects.filter(pk__in=stale).delete()
+        model.objects.bulk_create([
+            model(event_id=event_id, **{attribute: value})
+            for event_id, values in wanted.items()
+            for value in values - existing[event_id]
+        ])
+
+
+class EventMonth(models.Model):
+    """
+    One row per calendar month an event takes place in, kept in sync with
+    the event's dates. Used to find the events of a date range and to count
+    events per month via the index.
+    """
+    event = models.ForeignKey(to=Event, on_delete=models.CASCADE, related_name='months')
+    month = models.DateField()  # The first day of the month
+
+    MAX_MONTHS = 36
+
+    class Meta:
+        unique_together = (('month', 'event'),)
+
+    @classmethod
+    def get_months(cls, start_date, end_date=None):
+        """
+        The first days of all months from ``start_date`` to ``end_date``,
+        at most ``MAX_MONTHS`` of them.
+        """
+        if not start_date:
+            return []
+        month = start_date.replace(day=1)
+        last = max(end_date or start_date, start_date).replace(day=1)
+        months = []
+        while month <= last and len(months) < cls.MAX_MONTHS:
+            months.append(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+        return months
+
+
+def sync_months(outcomes):
+    """
+    Updates the EventMonth rows of the given ``(event, update_fields)``
+    pairs, for the events where the dates were written.
+    """
+    wanted = {
+        event.pk: set(EventMonth.get_months(event.start_date, event.end_date))
+        for event, update_fields in outcomes
+        if event.pk and (update_fields is None or not {'start_date', 'end_date'}.isdisjoint(update_fields))
+    }
+    if not wanted:
+        return
+    existing = defaultdict(set)
+    stale = []
+    for pk, event_id, month in EventMonth.objects.filter(event_id__in=wanted).values_list('pk', 'event_id', 'month'):
+        if month in wanted[event_id]:
+            existing[event_id].add(month)
+        else:
+            stale.append(pk)
+    if stale:
+        EventMonth.objects.filter(pk__in=stale).delete()
+    EventMonth.objects.bulk_create([
+        EventMonth(event_id=event_id, month=month)
+        for event_id, months in wanted.items()
+        for month in months - existing[event_id]
+    ])
+
+
+def sync_derived(outcomes):
+    """
+    Brings the tables derived from events up to date after the given
+    ``(event, update_fields)`` pairs have been saved.
+    """
+    sync_keywords(outcomes)
+    sync_months(outcomes)
+    search.sync_index(outcomes)
+
+
+class FetchJob(models.Model):
+    """
+    A queued fetch of an event, see ``when.events.queue``. There is at most
+    one job per event, so that repeated submissions coalesce.
+    """
+    event = models.OneToOneField(to=Event, on_delete=models.CASCADE, related_name='fetch_job')
+    requested_at = models.DateTimeField(db_index=True)
+    started_at = models.DateTimeField(null=True)
+    # Set if the event was submitted again while the job was running.
+    requeue = models.BooleanField(default=False)
+
+
+class CatalogueVersion(models.Model):
+    """
+    A single row holding the time the catalogue of imported events last
+    changed, see ``feeds.get_version``. It is bumped whenever imported data
+    changes and whenever an event is deleted.
+    """
+    changed = models.DateTimeField()
+
+    @classmethod
+    def get(cls):
+        return cls.objects.filter(pk=1).values_list('changed', flat=True).first()
+
+    @classmethod
+    def bump(cls):
+        current = now()
+        if not cls.objects.filter(pk=1).update(changed=current):
+            cls.objects.get_or_create(pk=1, defaults={'changed': current})
+
+
+class FetchMetrics(models.Model):
+    """
+    A single row holding the fetch metrics that processes exported, added
+    up (see ``when.events.metrics``).
+    """
+    data = FallbackJSONField(default=dict)
+
+    @classmethod
+    def get(cls):
+        return cls.objects.filter(pk=1).values_list('data', flat=True).first() or {}
+
+    @classmethod
+    def export(cls):
+        """Adds the metrics recorded in this process since the last export."""
+        data = metrics.take()
+        if not any(data.values()):
+            return
+        try:
+            with transaction.atomic():
+                row, _ = cls.objects.select_for_update().get_or_create(pk=1)
+                row.data = metrics.merge(row.data or {}, data)
+                row.save()
+        except DatabaseError:
+            metrics.restore(data)
+            raise
+
+
+@receiver(post_delete, sender=Event)
+def bump_catalogue_version(sender, **kwargs):
+    CatalogueVersion.bump()
 
 
 class UserManager(BaseUserManager):
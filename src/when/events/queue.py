@@ -0,0 +1,95 @@
+"""
+A database-backed queue of event fetches, so that submitting an event does
+not keep the web request open for the remote round trip.
+
+``enqueue`` adds a ``FetchJob`` for an event, or coalesces with the job that
+is already queued for it. Workers (see the ``process_queue`` command) claim
+jobs with a conditional UPDATE, which works on every database backend and
+never hands one job to two workers. Jobs whose worker died are claimed again
+after ``STALE_AFTER``.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils.timezone import now
+
+from when.events.models import FetchJob, FetchMetrics
+from when.events.refresh import (
+    DEFAULT_PER_HOST, DEFAULT_WORKERS, refresh_events,
+)
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(minutes=10)
+DEFAULT_LIMIT = 50
+DEFAULT_INTERVAL = 1
+
+
+def enqueue(event):
+    """
+    Queues a fetch of the event. Returns False if a fetch was queued
+    already, in which case both submissions are served by the same fetch.
+    """
+    job, created = FetchJob.objects.get_or_create(event=event, defaults={'requested_at': now()})
+    if not created:
+        # A running job may already have downloaded the old data.
+        FetchJob.objects.filter(pk=job.pk, started_at__isnull=False).update(requeue=True)
+    return created
+
+
+def claim(limit=DEFAULT_LIMIT):
+    """Claims up to ``limit`` jobs, oldest first, and returns them."""
+    current = now()
+    candidates = FetchJob.objects.filter(
+        Q(started_at__isnull=True) | Q(started_at__lt=current - STALE_AFTER)
+    ).select_related('event').order_by('requested_at')[:limit]
+    claimed = []
+    for job in candidates:
+        if FetchJob.objects.filter(pk=job.pk, started_at=job.started_at).update(started_at=current):
+            job.started_at = current
+            claimed.append(job)
+    return claimed
+
+
+def finish(job):
+    if not FetchJob.objects.filter(pk=job.pk, requeue=False).delete()[0]:
+        FetchJob.objects.filter(pk=job.pk).update(started_at=None, requeue=False)
+
+
+def process(limit=DEFAULT_LIMIT, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST):
+    """
+    Claims and runs up to ``limit`` jobs. Returns a list of ``(event, log)``.
+    Failures of single events are recorded as their outcome. Should the
+    refresh fail altogether, the remaining jobs are finished all the same,
+    so that they are not claimed and run into the same failure again.
+    """
+    jobs = {job.event_id: job for job in claim(limit)}
+    results = []
+    try:
+        for event, log in refresh_events(
+            [job.event for job in jobs.values()], workers=workers, per_host=per_host
+        ):
+            finish(jobs.pop(event.pk))
+            results.append((event, log))
+    finally:
+        for job in jobs.values():
+            finish(job)
+    return results
+
+
+def run(interval=DEFAULT_INTERVAL, **kwargs):
+    """
+    Processes jobs forever, polling every ``interval`` seconds when idle or
+    after an error, and exports the metrics after every round.
+    """
+    while True:
+        try:
+            processed = process(**kwargs)
+            FetchMetrics.export()
+        except Exception:
+            logger.exception('Processing the fetch queue failed.')
+            processed = None
+        if not processed:
+            time.sleep(interval)
@@ -0,0 +1,162 @@
+"""
+Refreshing many events at once.
+
+Downloads run concurrently in a bounded thread pool, with a cap on how many
+requests may be in flight against any single host. Everything touching the
+database (``Event._process`` and ``Event._fail``) runs in the calling thread,
+so the resulting states and Log rows are exactly those of ``Event.fetch``.
+Optionally, the resulting writes are collected and flushed in batches, one
+transaction per batch.
+"""
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.db import DatabaseError, transaction
+
+from when.events import hosts, metrics
+from when.events.models import CatalogueVersion, Log, sync_derived
+
+DEFAULT_WORKERS = 16
+DEFAULT_PER_HOST = 2
+DEFAULT_BATCH_SIZE = 100
+
+
+class Batch:
+    """
+    Collects the outcomes of ``Event._commit`` and writes them in a single
+    transaction. Log entries are written with ``bulk_create``, which means
+    that they do not receive a primary key on all database backends.
+    """
+
+    def __init__(self):
+        self.outcomes = []
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def add(self, event, update_fields, log):
+        self.outcomes.append((event, update_fields, log))
+
+    def flush(self):
+        """
+        Writes all collected outcomes and returns a list of ``(event, log)``.
+        Every event is saved in a savepoint of its own: if saving one fails,
+        for example on a duplicate short name, the event is failed instead,
+        and the rest of the batch is written as usual.
+        """
+        outcomes, self.outcomes = self.outcomes, []
+        results = []
+        saved = []
+        with metrics.FETCH_STAGE_SECONDS.time(stage='batch_save'), transaction.atomic():
+            for event, update_fields, log in outcomes:
+                # QuerySet.bulk_update is only available from Django 2.2 on.
+                try:
+                    if update_fields is None:
+                        with transaction.atomic():
+                            event.save()
+                    elif update_fields:
+                        with transaction.atomic():
+                            event.save(update_fields=update_fields)
+                except DatabaseError as e:
+                    results.append((event, event._fail('{}: {}'.format(type(e).__name__, e))))
+                    continue
+                saved.append((event, update_fields, log))
+                results.append((event, log))
+            sync_derived([(event, update_fields) for event, update_fields, log in saved])
+            for event, update_fields, log in saved:
+                if log.pk:
+                    log.save(update_fields=Log.REPEAT_FIELDS)
+            Log.objects.bulk_create([log for event, update_fields, log in saved if not log.pk])
+            if any(update_fields is None or 'last_changed' in update_fields for event, update_fields, log in saved):
+                CatalogueVersion.bump()
+        # Failed saves were counted by _fail already.
+        for event, update_fields, log in saved:
+            metrics.FETCH_RESULTS.inc(state=log.state)
+        return results
+
+
+def _host(event):
+    return hosts.get_host_name(event.data_url)
+
+
+def _download(event):
+    try:
+        return event, event._download(), None
+    except Exception as e:
+        return event, None, e
+
+
+def _handle(event, response, error, batch=None):
+    """
+    Records the outcome of a download. Any exception raised while
+    processing it is recorded as an error of this event, so that a single
+    broken event or document cannot abort the refresh of all others.
+    """
+    try:
+        if error is None:
+            return event._process(response, batch=batch)
+        if isinstance(error, requests.RequestException):
+            return event._fail(str(error), state="unreachable", batch=batch)
+    except Exception as e:
+        error = e
+    return event._fail('{}: {}'.format(type(error).__name__, error), batch=batch)
+
+
+def refresh_events(events, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, batch_size=None):
+    """
+    Fetches all given events and yields ``(event, log)`` tuples in the order
+    in which the downloads complete. With a ``batch_size``, the database
+    writes are grouped into transactions of that many events, and results
+    are yielded once their batch has been written.
+    """
+    batch = Batch() if batch_size else None
+    pending = defaultdict(deque)
+    for event in events:
+        try:
+            host = _host(event)
+        except Exception as e:
+            log = _handle(event, None, e, batch=batch)
+            if batch is None:
+                yield event, log
+            elif len(batch) >= batch_size:
+                yield from batch.flush()
+            continue
+        pending[host].append(event)
+    in_flight = defaultdict(int)
+    running = {}
+
+    def submit(executor):
+        # Round-robin over hosts, so that a single large host cannot occupy
+        # all workers while other hosts are waiting.
+        while len(running) < workers and pending:
+            submitted = False
+            for host in list(pending):
+                if len(running) >= workers:
+                    break
+                if in_flight[host] >= per_host:
+                    continue
+                queue = pending[host]
+                running[executor.submit(_download, queue.popleft())] = host
+                in_flight[host] += 1
+                submitted = True
+                if not queue:
+                    del pending[host]
+            if not submitted:
+                break
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        submit(executor)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight[running.pop(future)] -= 1
+                event, response, error = future.result()
+                log = _handle(event, response, error, batch=batch)
+                if batch is None:
+                    yield event, log
+                elif len(batch) >= batch_size:
+                    yield from batch.flush()
+            submit(executor)
+    if batch:
+        yield from batch.flush()
@@ -0,0 +1,82 @@
+"""
+Keeps the log table from growing without bounds.
+
+For every event, consecutive log entries with the same outcome are collapsed
+into one entry (keeping their count and first/last timestamp), large failed
+responses are truncated, and entries older than ``WHEN_LOG_MAX_AGE`` days are
+deleted, except for the ``WHEN_LOG_KEEP`` latest entries of each event.
+
+Events are processed in small chunks with one short transaction per chunk,
+so that a running compaction never blocks other writers for long.
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from when.events.models import Event, Log
+
+DEFAULT_CHUNK_SIZE = 50
+DELETE_CHUNK_SIZE = 500
+
+
+def _delete(pks):
+    for start in range(0, len(pks), DELETE_CHUNK_SIZE):
+        Log.objects.filter(pk__in=pks[start:start + DELETE_CHUNK_SIZE]).delete()
+
+
+def compact_event_logs(event_id, cutoff, keep):
+    """
+    Compacts the log entries of a single event. Returns a Counter of
+    collapsed, shrunk and pruned entries.
+    """
+    stats = Counter()
+    collapsed = []
+    previous = None
+    for log in Log.objects.filter(event_id=event_id).order_by('pk').iterator():
+        changed = False
+        content = Log.shrink_content(log.content)
+        if content is not log.content:
+            log.content = content
+            stats['shrunk'] += 1
+            changed = True
+        if previous is not None and previous.state == log.state and previous.content == log.content:
+            log.first_timestamp = previous.first_timestamp or previous.timestamp
+            log.count += previous.count
+            collapsed.append(previous.pk)
+            changed = True
+        if changed:
+            log.save(update_fields=['content', 'count', 'first_timestamp'])
+        previous = log
+    _delete(collapsed)
+    stats['collapsed'] += len(collapsed)
+
+    newest_kept = Log.objects.filter(event_id=event_id).order_by('-pk').values_list('pk', flat=True)[keep:keep + 1]
+    if newest_kept:
+        stats['pruned'] += Log.objects.filter(
+            event_id=event_id, timestamp__lt=cutoff, pk__lte=newest_kept[0]
+        ).delete()[0]
+    return stats
+
+
+def compact_logs(max_age=None, keep=None, chunk_size=DEFAULT_CHUNK_SIZE, pause=0):
+    """
+    Compacts the logs of all events. ``pause`` is the number of seconds to
+    wait between chunks, to leave room for other writers when running in
+    the background.
+    """
+    max_age = settings.WHEN_LOG_MAX_AGE if max_age is None else max_age
+    keep = settings.WHEN_LOG_KEEP if keep is None else keep
+    cutoff = now() - timedelta(days=max_age)
+    stats = Counter()
+    event_ids = list(Event.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(event_ids), chunk_size):
+        with transaction.atomic():
+            for event_id in event_ids[start:start + chunk_size]:
+                stats.update(compact_event_logs(event_id, cutoff, keep))
+        if pause and start + chunk_size < len(event_ids):
+            time.sleep(pause)
+    return stats
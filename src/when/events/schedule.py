@@ -0,0 +1,58 @@
+"""
+Adaptive polling: decides when an event should be fetched next.
+
+Events that changed recently are checked more often than events that have
+been static for a long time, failing events back off exponentially, and an
+approaching CfP deadline or start date shortens the interval again. Events
+that are over are only checked rarely.
+"""
+from datetime import timedelta
+
+MIN_INTERVAL = timedelta(hours=1)
+MAX_INTERVAL = timedelta(days=7)
+PAST_INTERVAL = timedelta(days=30)
+CFP_INTERVAL = timedelta(hours=6)
+CFP_WINDOW = timedelta(days=14)
+UPCOMING_INTERVAL = timedelta(hours=12)
+UPCOMING_WINDOW = timedelta(days=30)
+MAX_BACKOFF_STEPS = 10
+HISTORY_LENGTH = 20
+
+
+def is_change(state, content):
+    """Whether a log entry records new or changed event data."""
+    return state == 'ok' and bool(content) and (
+        content.get('action') == 'create' or bool(content.get('fields'))
+    )
+
+
+def get_interval(event, history, now):
+    """
+    ``history`` is a list of ``(state, content, timestamp, count)`` tuples
+    of the event's most recent log entries, newest first. ``count`` is the
+    number of outcomes a (collapsed) entry stands for.
+    """
+    failures = 0
+    for state, content, timestamp, count in history:
+        if state in ('ok', 'new'):
+            break
+        failures += count
+    if failures:
+        return min(MIN_INTERVAL * 2 ** min(failures, MAX_BACKOFF_STEPS), MAX_INTERVAL)
+
+    if event.end_date and event.end_date < now.date():
+        return PAST_INTERVAL
+
+    changes = [timestamp for state, content, timestamp, count in history if is_change(state, content)]
+    if changes:
+        # Check about four times as often as the event has been stable.
+        interval = (now - changes[0]) / 4
+    else:
+        interval = MAX_INTERVAL
+    interval = max(MIN_INTERVAL, min(interval, MAX_INTERVAL))
+
+    if event.cfp_deadline and now <= event.cfp_deadline <= now + CFP_WINDOW:
+        interval = min(interval, CFP_INTERVAL)
+    if event.start_date and now.date() <= event.start_date <= (now + UPCOMING_WINDOW).date():
+        interval = min(interval, UPCOMING_INTERVAL)
+    return interval
@@ -0,0 +1,153 @@
+"""
+Full-text search over events.
+
+The search index is a separate table next to the events: an FTS5 table on
+SQLite, and a table with a weighted tsvector and a GIN index on
+PostgreSQL. It is created by a migration, updated whenever an event's
+indexed fields are written (see ``Event._commit``), and can be rebuilt
+with the ``rebuild_search_index`` command. On other databases, searches
+fall back to substring matching.
+
+Every word of a query has to match, as a prefix. Results are ranked by
+where the words matched: the name counts most, the description least.
+Index rows of deleted events are harmless, as search results are looked up
+in the event table; rebuilding the index removes them.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Q
+
+FIELDS = ('name', 'short_name', 'organizer', 'location', 'description', 'tags')
+WEIGHTS = (10.0, 8.0, 2.0, 2.0, 1.0, 4.0)
+POSTGRES_WEIGHTS = ('A', 'A', 'C', 'C', 'D', 'B')
+FTS_TABLE = 'events_event_fts'
+POSTGRES_TABLE = 'events_event_search'
+MAX_TERMS = 10
+
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE {} USING fts5({}, prefix='2 3', tokenize='unicode61 remove_diacritics 2')".format(
+            FTS_TABLE, ', '.join(FIELDS)
+        ),
+    ],
+    'postgresql': [
+        'CREATE TABLE {} (event_id integer PRIMARY KEY REFERENCES events_event (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)'.format(POSTGRES_TABLE),
+        'CREATE INDEX {0}_document ON {0} USING gin (document)'.format(POSTGRES_TABLE),
+    ],
+}
+DROP_SQL = {
+    'sqlite': ['DROP TABLE IF EXISTS {}'.format(FTS_TABLE)],
+    'postgresql': ['DROP TABLE IF EXISTS {}'.format(POSTGRES_TABLE)],
+}
+
+
+def get_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def get_document(event):
+    document = [getattr(event, field) or '' for field in FIELDS]
+    # Tags are stored as ",foo,bar,".
+    document[FIELDS.index('tags')] = document[FIELDS.index('tags')].replace(',', ' ').strip()
+    return document
+
+
+def update_index(events, using=None):
+    """
+    Writes the index rows of the given (saved) events, to the database they
+    were saved to unless ``using`` is given.
+    """
+    events = [event for event in events if event.pk]
+    if not events:
+        return
+    connection = connections[using or events[0]._state.db or DEFAULT_DB_ALIAS]
+    if connection.vendor not in CREATE_SQL:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                'INSERT OR REPLACE INTO {} (rowid, {}) VALUES (%s{})'.format(FTS_TABLE, ', '.join(FIELDS), ', %s' * len(FIELDS)),
+                [[event.pk] + get_document(event) for event in events],
+            )
+        else:
+            document = ' || '.join(
+                "setweight(to_tsvector('simple', %s), '{}')".format(weight) for weight in POSTGRES_WEIGHTS
+            )
+            cursor.executemany(
+                'INSERT INTO {} (event_id, document) VALUES (%s, {}) '
+                'ON CONFLICT (event_id) DO UPDATE SET document = EXCLUDED.document'.format(POSTGRES_TABLE, document),
+                [[event.pk] + get_document(event) for event in events],
+            )
+
+
+def sync_index(outcomes):
+    """
+    Updates the index for the given ``(event, update_fields)`` pairs where
+    an indexed field was written.
+    """
+    update_index([
+        event for event, update_fields in outcomes
+        if update_fields is None or not set(FIELDS).isdisjoint(update_fields)
+    ])
+
+
+def rebuild(events, chunk_size=500):
+    """Empties the index and indexes the given events again."""
+    using = router.db_for_write(events.model)
+    connection = connections[using]
+    if connection.vendor not in CREATE_SQL:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(FTS_TABLE if connection.vendor == 'sqlite' else POSTGRES_TABLE))
+    count = 0
+    chunk = []
+    for event in events.iterator(chunk_size=chunk_size):
+        chunk.append(event)
+        if len(chunk) >= chunk_size:
+            update_index(chunk, using=using)
+            count += len(chunk)
+            chunk = []
+    update_index(chunk, using=using)
+    return count + len(chunk)
+
+
+def search_ids(query, limit=50, using=DEFAULT_DB_ALIAS):
+    """Returns the ids of the best matching events, best match first."""
+    terms = get_terms(query)
+    if not terms:
+        return []
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                'SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY bm25({0}, {1}) LIMIT %s'.format(
+                    FTS_TABLE, ', '.join(str(weight) for weight in WEIGHTS)
+                ),
+                [' '.join('"{}"*'.format(term) for term in terms), limit],
+            )
+        else:
+            cursor.execute(
+                "SELECT event_id FROM {}, to_tsquery('simple', %s) query WHERE document @@ query "
+                'ORDER BY ts_rank(document, query) DESC, event_id LIMIT %s'.format(POSTGRES_TABLE),
+                [' & '.join('{}:*'.format(term) for term in terms), limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(events, query, limit=50):
+    """
+    Returns the best matching events of the given queryset, best first.
+    """
+    if connections[events.db].vendor not in CREATE_SQL:
+        condition = Q()
+        for term in get_terms(query):
+            matches = Q()
+            for field in FIELDS:
+                matches |= Q(**{field + '__icontains': term})
+            condition &= matches
+        return list(events.filter(condition).order_by('name')[:limit]) if condition else []
+    ids = search_ids(query, limit, using=events.db)
+    found = events.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
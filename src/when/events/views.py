@@ -1,30 +1,88 @@
+import hashlib
+import hmac
 import json
+import math
 import os
+import time
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 
-import jsonschema
+import pytz
+from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
+    JsonResponse, StreamingHttpResponse,
+)
 from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.utils.timezone import is_naive, make_aware, now, utc
 from django.utils.translation import ugettext_lazy as _
-from django.views.generic import TemplateView, ListView
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import ListView, TemplateView, View
 
 from when import schema
-from when.events.models import Event, Log
+from when.events import api, calendar, feeds, geo, metrics, queue, search
+from when.events.models import Event, FetchMetrics, Log
+
+EXAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'example_event.json',
+)
+
+
+@lru_cache(maxsize=1)
+def _load_example(path, mtime):
+    with open(path) as f:
+        return json.dumps(json.load(f), indent=4)
+
+
+def get_example():
+    """The example event, formatted for display. Re-read when it changes."""
+    return _load_example(EXAMPLE_PATH, os.stat(EXAMPLE_PATH).st_mtime)
 
 
 class Docs(TemplateView):
+    """
+    The rendered page is cached until the example or the schema file
+    changes, and their modification time is used for conditional GETs.
+    Requests with pending messages are rendered without the cache, as the
+    messages are part of the page.
+    """
     template_name = 'events/docs.html'
+    schema_version = '0.1.0'
+    cache_timeout = 60 * 60
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['schema'] = schema.get_schema('0.1.0')
-        context['current_example'] = json.dumps(json.load(
-            open(os.path.join(
-                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                'example_event.json',
-            ))
-        ), indent=4)
+        context['schema'] = schema.get_schema(self.schema_version)
+        context['current_example'] = get_example()
         return context
 
+    def get(self, request, *args, **kwargs):
+        if len(messages.get_messages(request)):
+            return super().get(request, *args, **kwargs)
+        mtimes = (os.stat(EXAMPLE_PATH).st_mtime, os.stat(schema.get_schema_path(self.schema_version)).st_mtime)
+        last_modified = int(max(mtimes))
+        etag = '"{}"'.format(hashlib.sha1('docs:{}:{}:{}'.format(self.schema_version, *mtimes).encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            key = 'docs:{}'.format(etag.strip('"'))
+            content = cache.get(key)
+            if content is None:
+                response = super().get(request, *args, **kwargs).render()
+                cache.set(key, response.content, self.cache_timeout)
+            else:
+                response = HttpResponse(content)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
 
 class Validator(TemplateView):
     template_name = 'events/validator.html'
@@ -45,54 +103,481 @@ class Validator(TemplateView):
         if not version or version not in schema.VERSIONS:
             messages.error(request, _('Incorrect schema version supplied. Supported versions are: ') + ', '.join(schema.VERSIONS))
             return super().get(request)
-        used_schema = schema.get_schema(data.get("version"))
-        try:
-            jsonschema.validate(data, used_schema, format_checker=jsonschema.draft7_format_checker)
+        errors = schema.check(data)
+        if not errors:
             messages.success(request, _('Looking good!'))
-        except Exception as e:
-            message = e.message
-            if e.path:
-                message += ' (in ' + ', '.join(['"{}"'.format(p) for p in e.path]) + ')'
+        for error in errors:
+            message = error['message']
+            if error['path']:
+                message += ' (in ' + ', '.join(['"{}"'.format(p) for p in error['path']]) + ')'
             messages.error(request, _('Invalid data: ') + message)
         return super().get(request)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class ValidatorAPI(View):
+    """
+    Validates documents in bulk and reports all errors of every document.
+    The request body is either a single JSON document, a JSON array of
+    documents, or newline-delimited JSON (``application/x-ndjson``), in
+    which case the results are streamed back as NDJSON as well.
+    """
+
+    def result(self, document):
+        errors = schema.check(document)
+        return {'valid': not errors, 'errors': errors}
+
+    def error(self, message):
+        return JsonResponse({'error': str(message)}, status=400)
+
+    def post(self, request):
+        max_documents = settings.WHEN_VALIDATOR_MAX_DOCUMENTS
+        if request.content_type == 'application/x-ndjson':
+            lines = []
+            for line in request:
+                if line.strip():
+                    lines.append(line)
+                    if len(lines) > max_documents:
+                        return self.error(_('Please send at most {} documents.').format(max_documents))
+            return StreamingHttpResponse(
+                (json.dumps(self.ndjson_result(line)) + '\n' for line in lines),
+                content_type='application/x-ndjson',
+            )
+        try:
+            data = json.loads(request.body.decode())
+        except ValueError as e:
+            return self.error(_('Could not parse data: ') + str(e))
+        if not isinstance(data, list):
+            return JsonResponse(self.result(data))
+        if len(data) > max_documents:
+            return self.error(_('Please send at most {} documents.').format(max_documents))
+        return JsonResponse({'results': [self.result(document) for document in data]})
+
+    def ndjson_result(self, line):
+        try:
+            document = json.loads(line.decode())
+        except ValueError as e:
+            return {'valid': False, 'errors': [
+                {'message': 'Could not parse data: ' + str(e), 'path': [], 'schemaPath': []}
+            ]}
+        return self.result(document)
+
+
+def encode_cursor(log):
+    return '{}-{}'.format(int(log.timestamp.timestamp() * 1000000), log.id)
+
+
+def decode_cursor(value):
+    try:
+        timestamp, pk = value.split('-')
+        return datetime.fromtimestamp(int(timestamp) / 1000000, tz=utc), int(pk)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise Http404(_('Invalid cursor.'))
+
+
 class LogList(ListView):
+    """
+    Lists log entries newest first. Instead of page numbers, pages are
+    addressed by a (timestamp, id) cursor, so that neither a COUNT nor an
+    OFFSET is needed, however large the log grows:
+
+    - ``?before=<cursor>``: entries older than the cursor
+    - ``?after=<cursor>``: entries newer than the cursor
+    - ``?from=<cursor>``: the cursor's own entry and older ones
+    """
     template_name = 'events/log.html'
-    queryset = Log.objects.order_by('-timestamp')
-    paginate_by = 100
     context_object_name = 'logs'
+    page_size = 100
+
+    def get_queryset(self):
+        logs = Log.objects.select_related('event')
+        params = self.request.GET
+        if params.get('after'):
+            timestamp, pk = decode_cursor(params['after'])
+            page = list(logs.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+            ).order_by('timestamp', 'id')[:self.page_size + 1])
+            self.has_newer = len(page) > self.page_size
+            page = page[:self.page_size][::-1]
+            self.has_older = bool(page)
+            return page
+
+        if params.get('before') or params.get('from'):
+            inclusive = not params.get('before')
+            timestamp, pk = decode_cursor(params.get('before') or params['from'])
+            id_filter = Q(id__lte=pk) if inclusive else Q(id__lt=pk)
+            logs = logs.filter(Q(timestamp__lt=timestamp) | (Q(timestamp=timestamp) & id_filter))
+        page = list(logs.order_by('-timestamp', '-id')[:self.page_size + 1])
+        self.has_older = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.has_newer = bool(page) and Log.objects.filter(
+            Q(timestamp__gt=page[0].timestamp) | Q(timestamp=page[0].timestamp, id__gt=page[0].id)
+        ).exists()
+        return page
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        logs = context['logs']
+        if logs and self.has_older:
+            context['older_url'] = '?before=' + encode_cursor(logs[-1])
+        if logs and self.has_newer:
+            context['newer_url'] = '?after=' + encode_cursor(logs[0])
+        return context
 
-class EventList(TemplateView):
+
+class EventList(ListView):
+    """
+    Lists upcoming events, or with ``?q=``, the events matching the search
+    query, best match first.
+    """
     template_name = 'events/event_list.html'
+    context_object_name = 'events'
+    page_size = 50
 
+    def get_queryset(self):
+        events = Event.objects.filter(name__isnull=False)
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            return search.search(events, query, limit=self.page_size)
+        return events.filter(start_date__gte=now().date()).order_by('start_date', 'pk')[:self.page_size]
 
-class EventFeed(TemplateView):
-    template_name = 'events/docs.html'
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '').strip()
+        return context
+
+
+class CachedFeed(View):
+    """
+    Serves a feed from the cache, keyed on the catalogue version. Clients
+    sending the current ETag get an empty 304 response. On a cache miss,
+    the feed is streamed while it is being rendered.
+    """
+    kind = None
+    content_type = None
+
+    def get_chunks(self):
+        raise NotImplementedError
+
+    def get(self, request):
+        version = feeds.get_version()
+        etag = feeds.get_etag(self.kind, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+        key = 'feed:{}:{}'.format(self.kind, version)
+        body = cache.get(key)
+        if body is not None:
+            response = HttpResponse(body, content_type=self.content_type)
+        else:
+            response = StreamingHttpResponse(
+                feeds.cached_stream(key, self.get_chunks()), content_type=self.content_type
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
+
+
+class ICalFeed(CachedFeed):
+    kind = 'ical'
+    content_type = 'text/calendar; charset=utf-8'
+
+    def get_chunks(self):
+        return feeds.ical_chunks(feeds.get_events().order_by('start_date', 'pk'))
+
+
+class JSONFeed(CachedFeed):
+    kind = 'json'
+    content_type = 'application/json'
+
+    def get_chunks(self):
+        return feeds.json_chunks(feeds.get_events().order_by('-pk'))
+
+
+class UpdateFeed(View):
+    """
+    Lists the events that were created or changed, as JSON, oldest change
+    first:
+
+    - ``?since=<id or ISO timestamp>``: only changes after this log id or time
+    - ``?limit=<n>``: page size, at most ``max_limit``
+    - ``?wait=<seconds>``: if there are no changes yet, wait for them for at
+      most this many seconds (up to ``WHEN_UPDATES_MAX_WAIT``)
+
+    Clients continue with the returned ``next`` cursor as their ``since``.
+    """
+    default_limit = 100
+    max_limit = 1000
+    poll_interval = 1
+
+    def get(self, request):
+        params = request.GET
+        since_id, since_timestamp = 0, None
+        since = params.get('since', '').strip()
+        if since.isdigit():
+            since_id = int(since)
+        elif since:
+            try:
+                since_timestamp = parse_datetime(since.replace(' ', '+'))
+            except ValueError:
+                since_timestamp = None
+            if since_timestamp is None:
+                return HttpResponseBadRequest(_('Invalid "since": use a log id or an ISO 8601 timestamp.'))
+            if is_naive(since_timestamp):
+                since_timestamp = make_aware(since_timestamp, utc)
+        try:
+            limit = min(max(int(params.get('limit', self.default_limit)), 1), self.max_limit)
+            wait = float(params.get('wait', 0))
+            if not math.isfinite(wait):
+                raise ValueError(wait)
+            wait = min(max(wait, 0), settings.WHEN_UPDATES_MAX_WAIT)
+        except ValueError:
+            return HttpResponseBadRequest(_('"limit" and "wait" have to be numbers.'))
+
+        deadline = time.monotonic() + wait
+        while True:
+            changes, cursor, more = feeds.get_changes(since_id, since_timestamp, limit)
+            if changes or more or time.monotonic() >= deadline:
+                break
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+        return JsonResponse({
+            'changes': [feeds.serialize_change(log) for log in changes],
+            'next': cursor,
+            'more': more,
+        })
+
+
+class EventSearch(View):
+    """
+    Finds events by location, as JSON, nearest first:
+
+    - ``?lat=<latitude>&lon=<longitude>&radius=<km>``: events within the radius
+    - ``?bbox=<south>,<west>,<north>,<east>``: events within the box, ordered
+      by their distance to ``lat``/``lon`` if given, else to the box's centre
+    """
+    default_radius = 100
+    max_radius = 5000
+    default_limit = 50
+    max_limit = 500
+
+    def get(self, request):
+        params = request.GET
+        try:
+            limit = min(max(int(params.get('limit', self.default_limit)), 1), self.max_limit)
+            if params.get('bbox'):
+                south, west, north, east = (float(part) for part in params['bbox'].split(','))
+                latitude = float(params['lat']) if params.get('lat') else (south + north) / 2
+                longitude = float(params['lon']) if params.get('lon') else (
+                    geo.normalize_longitude((west + east) / 2 + (180 if west > east else 0))
+                )
+                events = Event.objects.within_box(south, west, north, east).by_distance(latitude, longitude)
+            else:
+                latitude, longitude = float(params['lat']), float(params['lon'])
+                radius = min(float(params.get('radius', self.default_radius)), self.max_radius)
+                events = Event.objects.near(latitude, longitude, radius)
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest(_('Please pass either "lat", "lon" and "radius", or "bbox".'))
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return HttpResponseBadRequest(_('The coordinates are out of range.'))
+        return JsonResponse({'events': [
+            {
+                'shortName': event.short_name,
+                'name': event.name,
+                'dataUrl': event.data_url,
+                'startDate': event.start_date.isoformat() if event.start_date else None,
+                'endDate': event.end_date.isoformat() if event.end_date else None,
+                'location': event.location,
+                'coordinates': event.coordinates,
+                'distance': round(geo.distance(latitude, longitude, event.latitude, event.longitude), 3),
+            }
+            for event in events.filter(name__isnull=False)[:limit]
+        ]})
+
+
+class EventAPI(View):
+    """
+    Base class of the read API. ``?fields=<key>,<key>`` limits the events to
+    the given schema keys, e.g. ``fields=name,startDate,cfpDeadline``.
+    """
+
+    def get_fields(self):
+        value = self.request.GET.get('fields', '').strip()
+        if not value:
+            return None
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        allowed = api.get_fields()
+        unknown = [field for field in fields if field not in allowed]
+        if unknown:
+            raise ValueError(unknown)
+        return fields
+
+    def get(self, request, **kwargs):
+        try:
+            fields = self.get_fields()
+        except ValueError:
+            return HttpResponseBadRequest(
+                _('Unknown field. Valid fields are: {}').format(', '.join(api.get_fields()))
+            )
+        return self.respond(fields, **kwargs)
+
+    def get_etag(self, kind, version, fields):
+        return feeds.get_etag('api:{}:{}'.format(kind, ','.join(fields or [])), version)
+
+
+class EventListAPI(EventAPI):
+    """All imported events, as JSON, in the order they were added."""
+
+    def respond(self, fields):
+        etag = self.get_etag('events', feeds.get_version(), fields)
+        response = get_conditional_response(self.request, etag=etag)
+        if response is not None:
+            return response
+        response = StreamingHttpResponse(
+            api.json_chunks(feeds.get_events().order_by('pk'), fields), content_type='application/json'
+        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
+
+
+class EventDetailAPI(EventAPI):
+    """One imported event, as JSON, by its short name."""
+
+    def respond(self, fields, short_name):
+        row = feeds.get_events().filter(short_name=short_name).values_list('pk', 'last_changed').first()
+        if row is None:
+            raise Http404()
+        etag = self.get_etag('event', api.get_cache_key(*row), fields)
+        response = get_conditional_response(self.request, etag=etag)
+        if response is not None:
+            return response
+        data = api.get_serialized([row])
+        if not data:
+            raise Http404()
+        response = JsonResponse(api.select(data[0], fields))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
+
+
+class EventCalendar(View):
+    """
+    The events and CfP deadlines of a date range, as JSON:
+
+    - ``?start=<date>&end=<date>``: the range, at most ``max_days`` long,
+      by default the current month
+    - ``?tz=<timezone>``: the viewer's timezone, used for CfP deadlines
+
+    ``months`` contains the number of events per month from ``count_months``
+    months before to ``count_months`` months after the range, for navigation.
+    """
+    max_days = 366
+    count_months = 12
+
+    def get(self, request):
+        params = request.GET
+        try:
+            tz = pytz.timezone(params.get('tz') or 'UTC')
+        except pytz.UnknownTimeZoneError:
+            return HttpResponseBadRequest(_('Unknown timezone.'))
+        today = now().astimezone(tz).date()
+        try:
+            start = parse_date(params['start']) if params.get('start') else today.replace(day=1)
+            end = parse_date(params['end']) if params.get('end') else (
+                start and calendar.add_months(start, 1) - timedelta(days=1)
+            )
+        except ValueError:
+            start = end = None
+        # The first and last representable days cannot be shifted between
+        # timezones for the CfP deadlines.
+        if start == date.min or end == date.max:
+            start = end = None
+        if not start or not end or end < start or (end - start).days >= self.max_days:
+            return HttpResponseBadRequest(
+                _('Please pass "start" and "end" as dates at most {} days apart.').format(self.max_days)
+            )
+
+        counts = calendar.get_month_counts(
+            calendar.add_months(start, -self.count_months), calendar.add_months(end, self.count_months)
+        )
+        return JsonResponse({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'timezone': tz.zone,
+            'events': [
+                {
+                    'shortName': event.short_name,
+                    'name': event.name,
+                    'url': (event.urls or {}).get('home') or event.data_url,
+                    'startDate': event.start_date.isoformat(),
+                    'endDate': (event.end_date or event.start_date).isoformat(),
+                    'timezone': event.timezone,
+                    'location': event.location,
+                }
+                for event in calendar.get_events(start, end)
+            ],
+            'cfps': [
+                {
+                    'shortName': event.short_name,
+                    'name': event.name,
+                    'url': (event.urls or {}).get('cfp') or (event.urls or {}).get('home') or event.data_url,
+                    'deadline': event.cfp_deadline.astimezone(tz).isoformat(),
+                }
+                for event in calendar.get_cfps(start, end, tz)
+            ],
+            'months': {month.strftime('%Y-%m'): count for month, count in counts.items()},
+        })
+
+
+class Metrics(View):
+    """
+    Fetch pipeline metrics in the Prometheus text format, for staff users
+    and requests with the ``WHEN_METRICS_TOKEN``.
+    """
+
+    def is_allowed(self, request):
+        if request.user.is_staff:
+            return True
+        token = settings.WHEN_METRICS_TOKEN
+        return bool(token) and hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer {}'.format(token)
+        )
+
+    def get(self, request):
+        if not self.is_allowed(request):
+            return HttpResponseForbidden(_('You are not allowed to read the metrics.'))
+        return HttpResponse(
+            metrics.render(FetchMetrics.get()), content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
 
 
 class StartPage(TemplateView):
     template_name = 'events/index.html'
 
     def post(self, request):
-        url = request.POST.get('url').lower().strip()
-        if not url.startswith('http'):
+        url = request.POST.get('url', '').lower().strip()
+        try:
+            if not url.startswith('http'):
+                raise ValidationError(url)
+            Event._meta.get_field('data_url').run_validators(url)
+        except ValidationError:
             messages.error(request, _('This URL is invalid. Please provide a HTTP or HTTPS URL.'))
             return super().get(request)
-        event, created = Event.objects.get_or_create(data_url=url)
+        event, created = Event.objects.get_or_create(data_url=url, defaults={'state': 'new'})
         if created:
-            Log.objects.create(event=event, state='new')
-            event.needs_review = bool(request.headers.get('X_WHEN_EVENTS'))
-            event.save()
-        elif event.needs_review and request.headers.get('X_WHEN_EVENTS'):
-            event.needs_review = False
+            log = Log.objects.create(event=event, state='new')
+            event.needs_review = bool(request.META.get('HTTP_X_WHEN_EVENTS'))
             event.save()
-        log = event.fetch()
-        if event.state != 'ok':
-            messages.error(request, _('There was an error when fetching the event.'))
-        elif created:
-            messages.success(request, _('The event was successfully created!'))
         else:
-            messages.success(request, _('The event was successfully updated!'))
-        return redirect('/logs#log-' + str(log.id))
+            if event.needs_review and request.META.get('HTTP_X_WHEN_EVENTS'):
+                event.needs_review = False
+                event.save()
+            log = event.logs.order_by('-pk').first()
+        queue.enqueue(event)
+        if created:
+            messages.success(request, _('The event was registered and will be imported shortly.'))
+        else:
+            messages.success(request, _('The event will be updated shortly.'))
+        if log is None:
+            return redirect('/log')
+        return redirect('/log?from={}#log-{}'.format(encode_cursor(log), log.id))
@@ -1,11 +1,134 @@
+import glob
+import hashlib
 import json
 import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 
-VERSIONS = ["0.1.0"]
+import jsonschema
+from jsonschema.exceptions import best_match
 
+SCHEMA_DIR = os.path.dirname(__file__)
+VERSIONS = []
+RESULT_CACHE_SIZE = 1024
 
+_results = OrderedDict()
+_results_lock = threading.Lock()
+_derived_caches = []
+
+
+def _version_key(version):
+    return [int(part) if part.isdigit() else part for part in version.split(".")]
+
+
+def derived(function):
+    """
+    Caches the results of ``function`` like ``lru_cache``, until the next
+    ``reload()``. Use it for anything that is built from the schemas.
+    """
+    function = lru_cache(maxsize=None)(function)
+    _derived_caches.append(function)
+    return function
+
+
+def reload():
+    """
+    Forgets all loaded schemas, validators and everything built from them
+    (see ``derived``), and re-scans the schema directory for
+    ``schema-<version>.json`` files. Call this after adding a new schema
+    version at runtime.
+    """
+    get_schema.cache_clear()
+    get_validator.cache_clear()
+    for function in _derived_caches:
+        function.cache_clear()
+    with _results_lock:
+        _results.clear()
+    versions = []
+    for path in glob.glob(os.path.join(SCHEMA_DIR, "schema-*.json")):
+        match = re.match(r"^schema-(.+)\.json$", os.path.basename(path))
+        if match:
+            versions.append(match.group(1))
+    VERSIONS[:] = sorted(versions, key=_version_key)
+
+
+def get_schema_path(version):
+    return os.path.join(SCHEMA_DIR, "schema-" + str(version) + ".json")
+
+
+@lru_cache(maxsize=None)
 def get_schema(version):
-    with open(
-        os.path.join(os.path.dirname(__file__), "schema-" + str(version) + ".json")
-    ) as f:
+    """
+    Returns the parsed schema. The result is shared between all callers,
+    so please do not modify it.
+    """
+    with open(get_schema_path(version)) as f:
         return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def get_validator(version):
+    used_schema = get_schema(version)
+    cls = jsonschema.validators.validator_for(used_schema)
+    cls.check_schema(used_schema)
+    return cls(used_schema, format_checker=jsonschema.draft7_format_checker)
+
+
+def validate(instance, version):
+    """
+    Works like ``jsonschema.validate``, but uses the cached validator for
+    the given schema version. Raises the most relevant ValidationError.
+    """
+    error = best_match(get_validator(version).iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+def serialize_error(error):
+    return {
+        'message': error.message,
+        'path': list(error.absolute_path),
+        'schemaPath': list(error.absolute_schema_path),
+    }
+
+
+def _check(instance):
+    if not isinstance(instance, dict):
+        return [{'message': 'The document is not a JSON object.', 'path': [], 'schemaPath': []}]
+    version = instance.get('version')
+    if version not in VERSIONS:
+        return [{
+            'message': 'Unsupported version. Supported versions are: ' + ', '.join(VERSIONS),
+            'path': ['version'],
+            'schemaPath': [],
+        }]
+    errors = sorted(get_validator(version).iter_errors(instance), key=lambda e: list(e.absolute_path))
+    return [serialize_error(error) for error in errors]
+
+
+def check(instance):
+    """
+    Returns a list of all errors in the document, for the schema version it
+    declares, as dicts with ``message``, ``path`` and ``schemaPath``.
+    Results are kept in an LRU cache keyed by the hash of the document, so
+    re-submitted documents are not validated again. The returned list is
+    shared, so please do not modify it.
+    """
+    key = hashlib.sha256(
+        json.dumps(instance, sort_keys=True, separators=(',', ':')).encode()
+    ).hexdigest()
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    errors = _check(instance)
+    with _results_lock:
+        _results[key] = errors
+        while len(_results) > RESULT_CACHE_SIZE:
+            _results.popitem(last=False)
+    return errors
+
+
+reload()
@@ -72,12 +72,32 @@ WSGI_APPLICATION = 'when.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# The write-ahead log lets page views read while events are being written,
+# see when/db/__init__.py for the options.
+DATABASE_OPTIONS = {
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'busy_timeout': 20000,  # milliseconds
+        'synchronous': 'NORMAL',  # durable in WAL mode, except on power loss
+        'mmap_size': 256 * 1024 * 1024,  # bytes
+    },
+    'transaction_mode': 'IMMEDIATE',
+}
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'when.db',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': DATABASE_OPTIONS,
     }
 }
+# Reads on a connection of their own, which cannot write
+if os.environ.get('WHENEVENTS_READ_CONNECTION'):
+    DATABASES['read'] = dict(
+        DATABASES['default'],
+        OPTIONS={'pragmas': dict(DATABASE_OPTIONS['pragmas'], query_only=1)},
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_ROUTERS = ['when.db.router.ReadRouter']
 
 
 # Password validation
@@ -134,3 +154,30 @@ COMPRESS_ENABLED = COMPRESS_OFFLINE = not DEBUG
 COMPRESS_PRECOMPILERS = (('text/x-scss', 'django_libsass.SassCompiler'),)
 
 AUTH_USER_MODEL = 'events.User'
+
+# Fetching event data
+WHEN_FETCH_TIMEOUT = (5, 15)  # connect, read
+WHEN_FETCH_DEADLINE = 30  # seconds for the complete response
+WHEN_FETCH_MAX_SIZE = 1024 * 1024  # bytes
+WHEN_FETCH_POOL_SIZE = 32  # kept-alive connections per host
+WHEN_FETCH_HOST_RATE = 4  # requests per second and host
+WHEN_FETCH_HOST_BURST = 10  # requests to a host that may be sent at once
+WHEN_FETCH_BREAKER_THRESHOLD = 5  # consecutive failures until a host is skipped
+WHEN_FETCH_BREAKER_COOLDOWN = 60  # seconds until a skipped host is tried again
+
+# Most documents that may be sent to /api/validate at once
+WHEN_VALIDATOR_MAX_DOCUMENTS = 1000
+
+# Longest time a request to /feed/updates may wait for new changes. Has to
+# stay well below the worker timeout of the application server (gunicorn:
+# 30 seconds by default).
+WHEN_UPDATES_MAX_WAIT = 20  # seconds
+
+# Lets monitoring read /metrics with "Authorization: Bearer <token>". Staff
+# users may always read it.
+WHEN_METRICS_TOKEN = os.environ.get('WHENEVENTS_METRICS_TOKEN')
+
+# Log retention, see the compact_logs command
+WHEN_LOG_MAX_CONTENT_SIZE = 4096  # characters of a failed response to keep
+WHEN_LOG_MAX_AGE = 90  # days
+WHEN_LOG_KEEP = 20  # entries per event that are kept regardless of their age
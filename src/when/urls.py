@@ -7,11 +7,17 @@ from .events import views
 urlpatterns = [
     url('^docs$', views.Docs.as_view(), name='docs'),
     url('^docs/validator$', views.Validator.as_view(), name='docs'),
+    url('^api/events$', views.EventListAPI.as_view(), name='api.events'),
+    url('^api/events/search$', views.EventSearch.as_view(), name='api.events.search'),
+    url(r'^api/events/by-name/(?P<short_name>[-\w]+)$', views.EventDetailAPI.as_view(), name='api.event'),
+    url('^api/validate$', views.ValidatorAPI.as_view(), name='api.validate'),
     url('^log$', views.LogList.as_view(), name='logs'),
     url('^list$', views.EventList.as_view(), name='events'),
-    # url('^events/calendar$', views.EventCalendar.as_view(), name='events'),
-    url('^feed/new$', views.EventFeed.as_view(), name='feed.new'),
-    url('^feed/updates$', views.EventFeed.as_view(), name='feed.updates'),
+    url('^events/calendar$', views.EventCalendar.as_view(), name='events.calendar'),
+    url('^feed/new$', views.JSONFeed.as_view(), name='feed.new'),
+    url(r'^feed/events\.ics$', views.ICalFeed.as_view(), name='feed.ical'),
+    url('^feed/updates$', views.UpdateFeed.as_view(), name='feed.updates'),
+    url('^metrics$', views.Metrics.as_view(), name='metrics'),
     url('^$', views.StartPage.as_view(), name='startpage'),
     path('admin/', admin.site.urls),
 ]